@@ -1,32 +1,37 @@
-# MIT License
-
-# Copyright (c) 2021 xp
-
-# Permission is hereby granted, free of charge, to any person obtaining a copy
-# of this software and associated documentation files (the "Software"), to deal
-# in the Software without restriction, including without limitation the rights
-# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
-# copies of the Software, and to permit persons to whom the Software is
-# furnished to do so, subject to the following conditions:
-
-# The above copyright notice and this permission notice shall be included in all
-# copies or substantial portions of the Software.
-
-# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
-# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
-# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
-# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
-# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
-# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
-# SOFTWARE.
-from LPV.src.token import *
-from LPV.src.lexer import LPV_Lexer
-from LPV.src.error import LPV_Exception, ErrorType
-from LPV.src.parser import LPV_Parser
-from LPV.src.ast import Node, NodeVisitor
-from LPV.tools import *
-
-__author__ = "Xp-op"
-__version__ = "0.1"
-__license__ = "MIT License"
+# MIT License
+
+# Copyright (c) 2021 xp
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+from LPV.src.token import *
+from LPV.src.lexer import LPV_Lexer
+from LPV.src.rule import CharClass
+from LPV.src.error import LPV_Exception, ErrorType
+from LPV.src.parser import LPV_Parser, Operator, memoize, memoize_left_rec
+from LPV.src.grammar import Grammar
+from LPV.src.ast import Node, NodeVisitor, NodeTransformer, iter_fields, iter_child_nodes
+from LPV.src.arena import NodeArena, ArenaNode
+from LPV.src.batch import lex_many, parse_many
+from LPV.src.cache import ParseCache
+from LPV.tools import *
+
+__author__ = "Xp-op"
+__version__ = "0.1"
+__license__ = "MIT License"
 __name__ = "LexParseVisit"
\ No newline at end of file
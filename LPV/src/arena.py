@@ -0,0 +1,216 @@
+# MIT License
+
+# Copyright (c) 2021 xp
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+from array import array
+from LPV.src.ast import Node, NodeMeta, iter_fields
+
+class PackedList:
+    """A list (or tuple) field kept in a NodeArena, its items are coded like the fields."""
+    __slots__ = ("type", "codes")
+    
+    def __init__(self, type: type, codes: array):
+        self.type, self.codes = type, codes
+
+class ArenaNode(Node):
+    """
+    Light proxy of a node kept in a NodeArena, its fields and position are read from the arena when
+    they are used. Every node class get its own proxy class with the same node_name, so visitors
+    work on them like on the nodes. They are read only and a new one is made every time a node is read
+    (two proxies of the same node are == but not `is`).
+    """
+    __slots__ = ("arena", "node_id")
+    _fields = ()
+    
+    def __init__(self, arena: "NodeArena", node_id: int):
+        self.arena, self.node_id = arena, node_id
+    
+    def __eq__(self, other):
+        return type(other) is type(self) and other.arena is self.arena and other.node_id == self.node_id
+    
+    def __hash__(self):
+        return hash((id(self.arena), self.node_id))
+    
+    def __reduce__(self):
+        return arena_node, (self.arena, self.node_id)
+    
+    @property
+    def offset(self):
+        offset = self.arena.offsets[self.node_id]
+        return None if offset == -1 else offset
+    
+    @property
+    def index(self):
+        return self.arena.index
+    
+    @property
+    def line(self):
+        arena = self.arena
+        line = arena.lines[self.node_id]
+        if line != -1:
+            return line
+        offset = arena.offsets[self.node_id]
+        if offset == -1 or arena.index is None:
+            return None
+        return arena.index.lc(offset)[0]
+    
+    @property
+    def col(self):
+        arena = self.arena
+        if arena.lines[self.node_id] != -1:
+            col = arena.cols[self.node_id]
+            return None if col == -1 else col
+        offset = arena.offsets[self.node_id]
+        if offset == -1 or arena.index is None:
+            return None
+        return arena.index.lc(offset)[1]
+
+def arena_node(arena: "NodeArena", node_id: int) -> ArenaNode:
+    return arena[node_id]
+
+class NodeArena:
+    """
+    Nodes kept in typed arrays instead of one object each, for trees too big to keep in memory as objects.
+    For every node the arena keep its kind (node class and fields), its line and col (or its offset, the
+    arena keep the LineIndex of the first node that has one) and where its fields start in `items`.
+    A field is coded as the number of a node of the arena, -1 for None, or -2-i for `values[i]`
+    (tokens, strings, numbers...), lists of nodes are kept as the codes of their items.
+    `add` put a node (and the nodes in it) in the arena and return its proxy (see ArenaNode), the proxies
+    of the arena in the fields of a node are kept as their number. So a parser can add every node as
+    soon as it's made and the node objects are freed at once:
+        node = self.arena.add(BinOp(left, op, right, *self.lc))
+    or put a whole tree at once with `tree = arena.add(tree)`.
+    The nodes are read only, `reparse` don't shift them.
+    """
+    
+    def __init__(self):
+        self.kinds = array("H")
+        self.starts = array("I")
+        self.lines, self.cols = array("i"), array("i")
+        self.offsets = array("q")
+        self.items = array("q")
+        self.values = []
+        self.index = None
+        # (node class, fields) of every kind, the proxy class of every kind, kind by (node class, fields)
+        self.classes, self.proxies, self.kind_of = [], [], {}
+    
+    def __len__(self) -> int:
+        return len(self.kinds)
+    
+    def __getitem__(self, node_id: int) -> ArenaNode:
+        return self.proxies[self.kinds[node_id]](self, node_id)
+    
+    def __getstate__(self):
+        # the proxy classes are made again when loaded
+        state = self.__dict__.copy()
+        del state["proxies"]
+        return state
+    
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self.proxies = [self.make_proxy(cls, fields) for cls, fields in self.classes]
+    
+    def make_proxy(self, cls: type, fields: tuple) -> type:
+        attrs = {"__slots__": (), "node_name": cls.node_name, "_fields": fields, "__module__": __name__}
+        for k, name in enumerate(fields):
+            if name in ("arena", "node_id"):
+                raise TypeError(f"{cls.__name__} can't be kept in a NodeArena, it has a field named {name}")
+            attrs[name] = property(lambda self, k=k: self.arena.field(self.node_id, k))
+        return NodeMeta(cls.__name__, (ArenaNode,), attrs)
+    
+    def kind(self, node: Node) -> int:
+        cls = type(node)
+        fields = cls._fields if cls._fields is not None else tuple(name for name, _ in iter_fields(node))
+        kind = self.kind_of.get((cls, fields))
+        if kind is None:
+            if len(self.classes) == 65536:
+                raise TypeError("A NodeArena can't have more than 65536 kinds of node")
+            self.proxies.append(self.make_proxy(cls, fields))
+            self.classes.append((cls, fields))
+            kind = self.kind_of[(cls, fields)] = len(self.classes)-1
+        return kind
+    
+    def reserve(self, node: Node) -> int:
+        """Give a number to `node` and keep its kind and position, its fields are kept by `fill`."""
+        self.kinds.append(self.kind(node))
+        self.starts.append(0)
+        try:
+            line, col = Node.line.__get__(node), Node.col.__get__(node)
+        except AttributeError:
+            # resolved from the offset
+            line = col = None
+        self.lines.append(-1 if line is None else line)
+        self.cols.append(-1 if col is None else col)
+        self.offsets.append(-1 if node.offset is None else node.offset)
+        if self.index is None and node.index is not None:
+            self.index = node.index
+        return len(self.kinds)-1
+    
+    def encode(self, value, ids: dict) -> int:
+        if value is None:
+            return -1
+        if isinstance(value, ArenaNode):
+            if value.arena is not self:
+                raise TypeError("A node of another NodeArena can't be kept in this one")
+            return value.node_id
+        if isinstance(value, Node):
+            return ids[id(value)]
+        if type(value) is list or type(value) is tuple:
+            value = PackedList(type(value), array("q", [self.encode(v, ids) for v in value]))
+        self.values.append(value)
+        return -len(self.values)-1
+    
+    def decode(self, code: int):
+        if code >= 0:
+            return self.proxies[self.kinds[code]](self, code)
+        if code == -1:
+            return None
+        value = self.values[-code-2]
+        if type(value) is PackedList:
+            return value.type([self.decode(c) for c in value.codes])
+        return value
+    
+    def field(self, node_id: int, k: int):
+        return self.decode(self.items[self.starts[node_id]+k])
+    
+    def add(self, tree: Node) -> ArenaNode:
+        """Put `tree` and every node in it in the arena, return the proxy of `tree`."""
+        if isinstance(tree, ArenaNode):
+            if tree.arena is not self:
+                raise TypeError("A node of another NodeArena can't be kept in this one")
+            return tree
+        if not isinstance(tree, Node):
+            raise TypeError(f"tree must be a Node not {type(tree).__name__}")
+        ids, order, stack = {}, [], [tree]
+        while stack:
+            o = stack.pop()
+            if type(o) is list or type(o) is tuple:
+                stack.extend(o)
+            elif isinstance(o, Node) and not isinstance(o, ArenaNode) and id(o) not in ids:
+                ids[id(o)] = self.reserve(o)
+                order.append(o)
+                stack.extend(value for _, value in iter_fields(o))
+        items = self.items
+        for o in order:
+            node_id = ids[id(o)]
+            codes = [self.encode(value, ids) for _, value in iter_fields(o)]
+            self.starts[node_id] = len(items)
+            items.extend(codes)
+        return self[ids[id(tree)]]
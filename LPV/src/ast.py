@@ -1,82 +1,361 @@
-# MIT License
-
-# Copyright (c) 2021 xp
-
-# Permission is hereby granted, free of charge, to any person obtaining a copy
-# of this software and associated documentation files (the "Software"), to deal
-# in the Software without restriction, including without limitation the rights
-# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
-# copies of the Software, and to permit persons to whom the Software is
-# furnished to do so, subject to the following conditions:
-
-# The above copyright notice and this permission notice shall be included in all
-# copies or substantial portions of the Software.
-
-# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
-# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
-# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
-# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
-# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
-# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
-# SOFTWARE.
-from typing import Callable
-from LPV.src.error import ErrorType, LPV_Exception
-from LPV.tools.prettier import NodePrettier
-import traceback
-
-class Node:
-    
-    def __init__(self, line:int, col:int=None):
-        self.line, self.col = line, col
-        self.node_name = type(self).__name__
-    def __repr__(self) -> str:
-        d = self.__dict__.copy()
-        d.pop("line")
-        d.pop("col")
-        d.pop("node_name")
-        return NodePrettier(
-            self.node_name,
-            **d
-        ).__repr__()
-
-class NodeVisitor:
-    last_node = None
-    def visit(self, node: Node):
-        self.last_node = node
-        return getattr(self, "visit_"+node.node_name, self.visit_error)(node)
-    
-    def visit_error(self, node: Node):
-        raise NameError(f"no visit_{node.node_name} found")
-    
-    def visits(self, *nodes: Node):
-        return (self.visit(node) for node in nodes)
-    
-    def throw_error(self, error, msg, node: Node, pointer_width:int=1, **kwargs):
-        raise LPV_Exception(
-            error=error, msg=msg,
-            line=node.line, col=node.col,
-            source=self.source,
-            pointer_width=pointer_width,
-            when="Runtime",
-            **kwargs
-        )
-    
-    def run(self, node_tree: Node, source: str, crash_handler:Callable=print):
-        self.tree = node_tree
-        self.source = source
-        try:
-            r = self.visit(self.tree)
-        except LPV_Exception as e:
-            raise e
-        except Exception as e:
-            if crash_handler is print:
-                crash_handler(traceback.format_exc())
-            else:
-                crash_handler(e)
-            self.throw_error(
-                ErrorType.CRASH,
-                f"Uh oh. Looks like the interpreter got an Python Error.",
-                self.last_node
-            )
-        else:
-            return r
\ No newline at end of file
+# MIT License
+
+# Copyright (c) 2021 xp
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+from typing import Callable
+from LPV.src.error import ErrorType, LPV_Exception
+from LPV.src.context import Reentrant, reentrant
+from LPV.tools.prettier import NodePrettier
+import inspect, traceback
+
+# attributes of a Node that are not its fields
+POSITION = ("line", "col", "offset", "index", "node_name", "token_span")
+
+class NodeMeta(type):
+    """
+    Set `node_name` on every Node class. A class made with `slots=True` get its `_fields` (the ones its
+    bases don't already have) as `__slots__`, so its nodes don't have a `__dict__`:
+        class BinOp(Node, slots=True):
+            _fields = ("left", "op", "right")
+    Other attributes can't be set on those nodes, and two slotted classes can't be both bases of a class.
+    """
+    
+    def __new__(mcls, name: str, bases: tuple, namespace: dict, slots:bool=False, **kwargs):
+        if slots is True:
+            fields = namespace.get("_fields")
+            if fields is None or "__slots__" in namespace:
+                raise TypeError(f"{name} must have _fields and no __slots__ to be made with slots=True")
+            for f in fields:
+                if f in namespace:
+                    raise TypeError(f"The field {f} of {name} can't have a value in the class with slots=True")
+            taken = set()
+            for base in bases:
+                for klass in base.__mro__:
+                    names = klass.__dict__.get("__slots__", ())
+                    taken.update((names,) if isinstance(names, str) else names)
+            namespace["__slots__"] = tuple(f for f in fields if f not in taken)
+        cls = super().__new__(mcls, name, bases, namespace, **kwargs)
+        if "node_name" not in namespace:
+            cls.node_name = name
+        return cls
+
+class Node(metaclass=NodeMeta):
+    # the subclasses have a __dict__ for their attributes, unless they are made with slots=True (see NodeMeta)
+    __slots__ = ("line", "col", "offset", "index", "token_span")
+    # names of the fields with the children of the node, None for every attribute set in __init__
+    _fields = None
+    
+    def __init__(self, line:int=None, col:int=None, offset:int=None, index=None):
+        """Give either line and col, or the offset and the LineIndex to resolve them from later."""
+        if line is not None or offset is None:
+            self.line, self.col = line, col
+        self.offset, self.index = offset, index
+    def __getattr__(self, name):
+        if name == "line" or name == "col":
+            if self.index is None or self.offset is None:
+                return None
+            return self.index.lc(self.offset)[name == "col"]
+        if name == "offset" or name == "index" or name == "token_span":
+            # slot not set
+            return None
+        raise AttributeError(name)
+    def __repr__(self) -> str:
+        return NodePrettier(
+            self.node_name,
+            **dict(iter_fields(self))
+        ).__repr__()
+
+def explicit_line(node: Node):
+    """The line given to `node` when it was made, None when it's resolved from its offset."""
+    try:
+        return Node.line.__get__(node)
+    except AttributeError:
+        return None
+
+def iter_fields(node: Node):
+    """(name, value) of every field of `node`."""
+    if node._fields is None:
+        for name, value in getattr(node, "__dict__", {}).items():
+            if name not in POSITION:
+                yield name, value
+    else:
+        for name in node._fields:
+            yield name, getattr(node, name, None)
+
+def iter_child_nodes(node: Node):
+    """Every Node in the fields of `node`, and in the lists and tuples in them."""
+    for _, value in iter_fields(node):
+        if isinstance(value, Node):
+            yield value
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                if isinstance(item, Node):
+                    yield item
+
+def visit_all(nodes):
+    """What `NodeVisitor.walk` run when a list of nodes is yielded: the list of their values."""
+    values = []
+    for node in nodes:
+        values.append((yield node))
+    return values
+
+class NodeVisitor(Reentrant):
+    last_node = None
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.compile_dispatch()
+    
+    @classmethod
+    def compile_dispatch(cls):
+        """
+        Table of the visit_* methods of the class by node name, made when the class is made
+        (call it again if you add visit_* methods later). Every node class get its method
+        from it the first time one is visited, `dispatch` keep it by node class.
+        """
+        cls.visitors = {
+            name[6:]: getattr(cls, name) for name in dir(cls) if name.startswith("visit_")
+        }
+        cls.compilers = {
+            name[8:]: getattr(cls, name) for name in dir(cls)
+            if name.startswith("compile_") and name != "compile_dispatch" and callable(getattr(cls, name))
+        }
+        cls.dispatch, cls.steps, cls.compiler_dispatch = {}, {}, {}
+    
+    def step_for(self, node: Node) -> tuple:
+        """The visit_* method of the class of `node` and if it's a generator."""
+        method = self.visitors.get(node.node_name, type(self).visit_error)
+        step = self.steps[type(node)] = (method, inspect.isgeneratorfunction(method))
+        return step
+    
+    def visit(self, node: Node):
+        self.last_node = node
+        method = self.dispatch.get(type(node))
+        if method is None:
+            method, generator = self.step_for(node)
+            if generator is True:
+                method = type(self).walk
+            self.dispatch[type(node)] = method
+        return method(self, node)
+    
+    def walk(self, node: Node):
+        """
+        Visit `node` without recursion. A visit_* method that is a generator yield a child node (or a
+        list of nodes) and get back its value (or the list of their values), then return its own value:
+            def visit_BinOp(self, node):
+                left = yield node.left
+                right = yield node.right
+                return left+right
+        Yielding None (an empty child) give back None. The generators wait on a stack, so deep trees
+        don't hit the recursion limit. `visit` use it for the nodes with a generator method, other
+        visit_* methods are called as usual.
+        """
+        steps, stack, value = self.steps, [], None
+        while True:
+            if node is not None:
+                self.last_node = node
+                step = steps.get(type(node))
+                if step is None:
+                    step = self.step_for(node)
+                if step[1] is True:
+                    stack.append(step[0](self, node))
+                    value = None
+                else:
+                    value = step[0](self, node)
+                    if not stack:
+                        return value
+            try:
+                node = stack[-1].send(value)
+            except StopIteration as e:
+                stack.pop()
+                if not stack:
+                    return e.value
+                node, value = None, e.value
+                continue
+            if type(node) is list or type(node) is tuple:
+                stack.append(visit_all(node))
+                node, value = None, None
+            elif node is None:
+                # an empty child, its value is None
+                value = None
+            elif not isinstance(node, Node):
+                raise TypeError(
+                    f"{stack[-1].__qualname__} yielded {type(node).__name__}, "
+                    "a visit_* method can only yield a Node, a list of nodes or None"
+                )
+    
+    def visit_error(self, node: Node):
+        raise NameError(f"no visit_{node.node_name} found")
+    
+    def generic_visit(self, node: Node):
+        """Visit every child of `node` (see `Node._fields`)."""
+        for child in iter_child_nodes(node):
+            self.visit(child)
+    
+    def visits(self, *nodes: Node):
+        return list(map(self.visit, nodes))
+    
+    def throw_error(self, error, msg, node: Node, pointer_width:int=1, **kwargs):
+        raise LPV_Exception(
+            error=error, msg=msg,
+            line=node.line, col=node.col,
+            source=self.source, index=node.index,
+            pointer_width=pointer_width,
+            when="Runtime",
+            **kwargs
+        )
+    
+    @reentrant
+    def run(self, node_tree: Node, source: str, crash_handler:Callable=print):
+        self.tree = node_tree
+        self.source = source
+        try:
+            r = self.visit(self.tree)
+        except LPV_Exception as e:
+            raise e
+        except Exception as e:
+            if crash_handler is print:
+                crash_handler(traceback.format_exc())
+            else:
+                crash_handler(e)
+            self.throw_error(
+                ErrorType.CRASH,
+                f"Uh oh. Looks like the interpreter got an Python Error.",
+                self.last_node
+            )
+        else:
+            return r
+    
+    def compile(self, node: Node) -> Callable:
+        """
+        The function made by the compile_* method of `node`. Nodes without one are visited
+        by `visit` when the function is called.
+        """
+        self.last_node = node
+        method = self.compiler_dispatch.get(type(node))
+        if method is None:
+            method = self.compiler_dispatch[type(node)] = self.compilers.get(node.node_name)
+        if method is None:
+            func = lambda *args: self.visit(node)
+        else:
+            func = method(self, node)
+        code, nodes = getattr(func, "__code__", None), self.__dict__.get("compiled_nodes")
+        if code is not None and nodes is not None:
+            # to find the node of a function in a traceback (see node_of)
+            nodes.setdefault(code, []).append((func, node))
+        return func
+    
+    def node_of(self, tb) -> Node:
+        """The node whose compiled function was running the deepest in the traceback `tb`, or None."""
+        frames = []
+        while tb is not None:
+            frames.append(tb.tb_frame)
+            tb = tb.tb_next
+        for frame in reversed(frames):
+            entries = self.compiled_nodes.get(frame.f_code)
+            if not entries:
+                continue
+            if len(entries) == 1:
+                return entries[0][1]
+            # the functions of the same compile_* method only differ by their closure
+            names, f_locals = frame.f_code.co_freevars, frame.f_locals
+            for func, node in entries:
+                if all(
+                    name in f_locals and f_locals[name] is cell.cell_contents
+                    for name, cell in zip(names, func.__closure__ or ())
+                ):
+                    return node
+        return None
+    
+    def program(self, node_tree: Node, source: str, crash_handler:Callable=print) -> Callable:
+        """
+        Compile `node_tree` once with the compile_* methods of the visitor and return a function
+        running it, to run the same tree many times without visiting every node again:
+            def compile_BinOp(self, node):
+                left, right = self.compile(node.left), self.compile(node.right)
+                if node.op == T.PLUS:
+                    return lambda: left()+right()
+                ...
+        The arguments given to the function are given to the compiled function of `node_tree`.
+        A Python error while it run is raised as a CRASH at the node where it happened.
+        """
+        # the compiled functions keep their own copy of the visitor (and its source)
+        visitor = self.new_context()
+        visitor.tree, visitor.source, visitor.compiled_nodes = node_tree, source, {}
+        try:
+            func = visitor.compile(node_tree)
+        except LPV_Exception as e:
+            raise e
+        except Exception as e:
+            if crash_handler is print:
+                crash_handler(traceback.format_exc())
+            else:
+                crash_handler(e)
+            visitor.throw_error(
+                ErrorType.CRASH,
+                f"Uh oh. Looks like the compiler got an Python Error.",
+                visitor.last_node
+            )
+        def run(*args):
+            try:
+                return func(*args)
+            except LPV_Exception as e:
+                raise e
+            except Exception as e:
+                if crash_handler is print:
+                    crash_handler(traceback.format_exc())
+                else:
+                    crash_handler(e)
+                node = visitor.node_of(e.__traceback__)
+                visitor.throw_error(
+                    ErrorType.CRASH,
+                    f"Uh oh. Looks like the interpreter got an Python Error.",
+                    node_tree if node is None else node
+                )
+        return run
+
+NodeVisitor.compile_dispatch()
+
+class NodeTransformer(NodeVisitor):
+    """
+    NodeVisitor that replace every node by what its visit_* method return (None remove it
+    from a list), nodes without one are kept and their children are visited.
+    """
+    
+    def visit_error(self, node: Node):
+        return self.generic_visit(node)
+    
+    def generic_visit(self, node: Node):
+        for name, value in list(iter_fields(node)):
+            if isinstance(value, Node):
+                setattr(node, name, self.visit(value))
+            elif isinstance(value, list):
+                items = []
+                for item in value:
+                    if isinstance(item, Node):
+                        item = self.visit(item)
+                        if item is None:
+                            continue
+                        if isinstance(item, list):
+                            items.extend(item)
+                            continue
+                    items.append(item)
+                value[:] = items
+        return node
\ No newline at end of file
@@ -0,0 +1,124 @@
+# MIT License
+
+# Copyright (c) 2021 xp
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Iterable, Iterator
+from LPV.src.error import LPV_Exception
+
+class Worker:
+    """The lexer, parser and visitor of one worker process, made once by `init_worker`."""
+    current = None
+    
+    def __init__(self, lexer: Callable, parser: Callable=None, visitor: Callable=None,
+                 paths:bool=False, crash_handler:Callable=print, compact:bool=False):
+        self.lexer = lexer()
+        self.parser = parser() if parser is not None else None
+        self.visitor = visitor() if visitor is not None else None
+        self.paths, self.crash_handler, self.compact = paths, crash_handler, compact
+    
+    def read(self, path: str):
+        if self.lexer.bytes_mode is True:
+            with open(path, "rb") as f:
+                return f.read()
+        with open(path, encoding=self.lexer.encoding) as f:
+            return f.read()
+    
+    def run(self, source):
+        if self.paths is True:
+            source = self.read(source)
+        tree = self.lexer.lex(source, crash_handler=self.crash_handler, compact=self.compact)
+        if self.parser is None:
+            return tree
+        node = self.parser.parse(tree, self.crash_handler)
+        if self.visitor is None:
+            return node
+        return self.visitor.run(node, tree.source, self.crash_handler)
+    
+    def run_batch(self, batch: list) -> list:
+        results = []
+        for i, source in batch:
+            try:
+                results.append((i, self.run(source)))
+            except LPV_Exception as e:
+                results.append((i, e))
+        return results
+
+def init_worker(*args):
+    Worker.current = Worker(*args)
+
+def run_batch(batch: list) -> list:
+    return Worker.current.run_batch(batch)
+
+def lex_chunk(chunk) -> list:
+    """Lex one chunk of a source for `LPV_Lexer.lex_parallel`, the tokens are sent back without their index."""
+    worker = Worker.current
+    tokens = list(worker.lexer.lex(chunk, crash_handler=worker.crash_handler).tokens)
+    for token in tokens:
+        token.index = None
+    return tokens
+
+def batches(sources: Iterable, size:int) -> Iterator[list]:
+    batch = []
+    for item in enumerate(sources):
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def run_many(sources: Iterable, worker_args: tuple, workers:int=None, ordered:bool=True,
+             batch_size:int=64) -> Iterator:
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=worker_args) as executor:
+        if ordered is True:
+            for results in executor.map(run_batch, batches(sources, batch_size)):
+                for _, r in results:
+                    yield r
+        else:
+            futures = [executor.submit(run_batch, b) for b in batches(sources, batch_size)]
+            for future in as_completed(futures):
+                yield from future.result()
+
+def lex_many(lexer: Callable, sources: Iterable, workers:int=None, ordered:bool=True,
+             paths:bool=False, batch_size:int=64, crash_handler:Callable=print,
+             compact:bool=False) -> Iterator:
+    """
+    Lex every source in a pool of processes, each process make its lexer once with `lexer()`
+    (a LPV_Lexer subclass or any picklable function returning a lexer).
+    `sources` are paths to read when `paths` is True.
+    Yield a TokenTree, or the LPV_Exception raised, for every source in the order of `sources`.
+    When `ordered` is False, yield (index in sources, result) as soon as they are done instead.
+    """
+    return run_many(
+        sources, (lexer, None, None, paths, crash_handler, compact), workers, ordered, batch_size
+    )
+
+def parse_many(lexer: Callable, parser: Callable, sources: Iterable, visitor: Callable=None,
+               workers:int=None, ordered:bool=True, paths:bool=False, batch_size:int=64,
+               crash_handler:Callable=print) -> Iterator:
+    """
+    Like `lex_many` but the tokens are also parsed with `parser()` in the worker and,
+    when `visitor` is given, the result of the parser is run with `visitor()`.
+    Yield what the parser (or the visitor) return, or the LPV_Exception raised.
+    """
+    return run_many(
+        sources, (lexer, parser, visitor, paths, crash_handler, False), workers, ordered, batch_size
+    )
@@ -0,0 +1,257 @@
+# MIT License
+
+# Copyright (c) 2021 xp
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+from collections import OrderedDict
+from typing import Callable
+from LPV.src.error import LPV_Exception
+from LPV.src.token import TokenTree
+from LPV.src.rule import CharClass
+from LPV.src.grammar import Grammar
+from LPV.src.context import Reentrant
+from LPV.tools.codegen import rule_signature
+import hashlib, pickle, re, sys, threading, types
+
+fingerprints = {}
+
+def fingerprint(cls: type) -> bytes:
+    """Hash of the name and the code of a class and its bases, a lexer or parser that change get another one."""
+    f = fingerprints.get(cls)
+    if f is None:
+        h = hashlib.blake2b(digest_size=16)
+        for klass in cls.__mro__[:-1]:
+            h.update(f"{klass.__module__}.{klass.__qualname__}".encode())
+            for name, value in sorted(vars(klass).items()):
+                h.update(name.encode())
+                code = getattr(getattr(value, "__func__", value), "__code__", None)
+                if code is not None:
+                    h.update(code.co_code)
+                    h.update(repr(tuple(c for c in code.co_consts if not isinstance(c, types.CodeType))).encode())
+                elif isinstance(value, (str, bytes, int, float, bool, type(None))):
+                    h.update(repr(value).encode())
+        f = fingerprints[cls] = h.digest()
+    return f
+
+def signature(value, depth:int=4):
+    """
+    Description of what an instance attribute (rules, start, operators...) hold: the values and containers,
+    regexes, functions by their code and closure, other objects by their attributes (`depth` levels down).
+    """
+    if isinstance(value, (str, bytes, int, float, bool, type(None))):
+        return value
+    if depth == 0:
+        return type(value).__qualname__
+    depth -= 1
+    if isinstance(value, re.Pattern):
+        return ("re", value.pattern, value.flags)
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__,)+tuple(signature(v, depth) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return ("set",)+tuple(sorted((signature(v, depth) for v in value), key=repr))
+    if isinstance(value, dict):
+        return ("dict",)+tuple(sorted(((signature(k, depth), signature(v, depth)) for k, v in value.items()), key=repr))
+    if isinstance(value, type):
+        return ("class", value.__module__, value.__qualname__)
+    if isinstance(value, Reentrant):
+        # the lexer or parser itself, in a bound method or a closure
+        return ("instance", type(value).__qualname__)
+    if isinstance(value, types.MethodType):
+        return ("method", signature(value.__self__, depth), signature(value.__func__, depth))
+    if isinstance(value, CharClass):
+        return ("CharClass", signature(value.specs, depth), value.negate)
+    if isinstance(value, Grammar):
+        return ("Grammar", value.text)
+    code = getattr(value, "__code__", None)
+    if code is not None:
+        cells = []
+        for cell in getattr(value, "__closure__", None) or ():
+            try:
+                cells.append(signature(cell.cell_contents, depth))
+            except ValueError:
+                # empty cell
+                cells.append(None)
+        consts = tuple(c for c in code.co_consts if not isinstance(c, types.CodeType))
+        return ("function", value.__qualname__, code.co_code, repr(consts), tuple(cells))
+    if isinstance(value, (types.BuiltinFunctionType, types.MethodDescriptorType, types.WrapperDescriptorType)):
+        return ("builtin", getattr(value, "__qualname__", repr(value)))
+    state = dict(getattr(value, "__dict__", {}))
+    for klass in type(value).__mro__:
+        names = klass.__dict__.get("__slots__", ())
+        for name in (names,) if isinstance(names, str) else names:
+            if name != "__dict__" and name != "__weakref__":
+                state[name] = getattr(value, name, None)
+    return (type(value).__qualname__, signature(state, depth))
+
+def lexer_signature(lexer) -> bytes:
+    """Hash of the rules of `lexer`, two lexers of the same class with other rules get another one."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((rule_signature(lexer), signature(lexer.rules))).encode())
+    return h.digest()
+
+def parser_signature(parser) -> bytes:
+    """Hash of the start rule and args, operator table and grammar of `parser`."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr(signature(tuple(
+        parser.__dict__.get(name) for name in ("start", "operators", "atom", "grammar")
+    ))).encode())
+    return h.digest()
+
+def size_of(obj) -> int:
+    """About how many bytes `obj` use, with the nodes, tokens and containers in it."""
+    seen, stack, size = set(), [obj], 0
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, (type, types.FunctionType, types.MethodType)):
+            continue
+        seen.add(id(o))
+        size += sys.getsizeof(o)
+        if isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        elif isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        else:
+            if hasattr(o, "__dict__"):
+                stack.append(o.__dict__)
+            for klass in type(o).__mro__:
+                slots = klass.__dict__.get("__slots__", ())
+                for name in (slots,) if isinstance(slots, str) else slots:
+                    if name != "__dict__" and name != "__weakref__":
+                        stack.append(getattr(o, name, None))
+    return size
+
+class ParseCache:
+    """
+    LRU cache of what `lexer.lex` and `parser.parse` return (or the LPV_Exception they raise)
+    for a source, found by the hash of the source, of the lexer and parser classes and of the rules,
+    start, operators and grammar of the instances.
+    Args:
+        max_entries: how many results are kept
+        max_bytes: about how many bytes all the results can use, None for no limit
+        share: by default results are kept pickled and every hit get its own copy,
+               with share=True the same tree is given to everyone (faster, but don't change it),
+               a TokenTree is given with its own cursor over the shared tokens (see TokenTree.cursor)
+    """
+    
+    def __init__(self, max_entries:int=1024, max_bytes:int=None, share:bool=False):
+        self.max_entries, self.max_bytes, self.share = max_entries, max_bytes, share
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = 0
+        self.lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def __repr__(self):
+        return (
+            f"ParseCache({len(self.entries)} entries, {self.bytes} bytes, hits={self.hits}, "
+            f"misses={self.misses}, evictions={self.evictions})"
+        )
+    
+    def key(self, source, *parts) -> tuple:
+        h = hashlib.blake2b(digest_size=16)
+        h.update(source if isinstance(source, (bytes, bytearray)) else source.encode("utf-8", "surrogatepass"))
+        return (h.digest(), type(source) is str)+parts
+    
+    def get(self, key: tuple):
+        """The result kept for `key` (raised if it's an LPV_Exception), or KeyError."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                raise KeyError(key)
+            self.entries.move_to_end(key)
+            self.hits += 1
+        value = entry[0] if self.share is True else pickle.loads(entry[0])
+        if isinstance(value, LPV_Exception):
+            # a shared exception would keep the tracebacks of every time it was raised
+            raise value.with_traceback(None)
+        return self.hand_out(value)
+    
+    def hand_out(self, value):
+        """A shared TokenTree is given with its own cursor, parsing it change its position and memo."""
+        if self.share is True and isinstance(value, TokenTree):
+            return value.cursor()
+        return value
+    
+    def put(self, key: tuple, value):
+        if self.share is True:
+            stored, size = value, size_of(value)
+        else:
+            try:
+                stored = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            except RecursionError:
+                # too deep to be pickled, it's just not kept
+                return
+            except (pickle.PicklingError, AttributeError, TypeError) as e:
+                raise TypeError(f"{type(value).__name__} result can't be pickled ({e}), use ParseCache(share=True)")
+            size = len(stored)
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self.entries[key] = (stored, size)
+            self.bytes += size
+            while self.entries and (
+                len(self.entries) > self.max_entries
+                or (self.max_bytes is not None and self.bytes > self.max_bytes)
+            ):
+                _, (_, size) = self.entries.popitem(last=False)
+                self.bytes -= size
+                self.evictions += 1
+    
+    def run(self, key: tuple, func: Callable, *args):
+        try:
+            return self.get(key)
+        except KeyError:
+            pass
+        try:
+            value = func(*args)
+        except LPV_Exception as e:
+            self.put(key, e)
+            raise e
+        self.put(key, value)
+        # without share the cache only has a pickled copy, this one can be given away
+        return self.hand_out(value)
+    
+    def lex(self, lexer, source, ignore_un_update_pos:bool=False, crash_handler:Callable=print,
+            compact:bool=False):
+        """`lexer.lex(source, ...)`, from the cache when it's there."""
+        key = self.key(
+            source, "lex", fingerprint(type(lexer)), lexer_signature(lexer), lexer.bytes_mode,
+            lexer.encoding, ignore_un_update_pos, compact
+        )
+        return self.run(key, lexer.lex, source, ignore_un_update_pos, crash_handler, compact)
+    
+    def parse(self, lexer, parser, source, crash_handler:Callable=print):
+        """`parser.parse(lexer.lex(source))`, from the cache when it's there."""
+        key = self.key(
+            source, "parse", fingerprint(type(lexer)), lexer_signature(lexer), lexer.bytes_mode, lexer.encoding,
+            fingerprint(type(parser)), parser_signature(parser)
+        )
+        return self.run(
+            key, lambda: parser.parse(lexer.lex(source, crash_handler=crash_handler), crash_handler)
+        )
+    
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
@@ -0,0 +1,120 @@
+# MIT License
+
+# Copyright (c) 2021 xp
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+from typing import Callable
+import functools, inspect, threading, types
+
+def rebind(func, old, new):
+    """
+    `func` calling `new` instead of `old`: a method of `old` is bound to `new` and a function
+    using `old` from its closure (like `lambda: self.skip()`) is made again with `new` in it.
+    Anything else is returned as it is.
+    """
+    if isinstance(func, types.MethodType):
+        return types.MethodType(func.__func__, new) if func.__self__ is old else func
+    if not isinstance(func, types.FunctionType) or not func.__closure__:
+        return func
+    cells, changed = [], False
+    for cell in func.__closure__:
+        try:
+            value = cell.cell_contents
+        except ValueError:
+            # empty cell
+            value = None
+        if value is old:
+            cell, changed = types.CellType(new), True
+        cells.append(cell)
+    if changed is False:
+        return func
+    f = types.FunctionType(func.__code__, func.__globals__, func.__name__, func.__defaults__, tuple(cells))
+    f.__kwdefaults__ = func.__kwdefaults__
+    f.__dict__.update(func.__dict__)
+    return f
+
+def reentrant(method: Callable) -> Callable:
+    """
+    Run `method` on a context from `self.acquire_context()` and give it back when it return,
+    or when the generator is done for generator methods.
+    """
+    if inspect.isgeneratorfunction(method):
+        @functools.wraps(method)
+        def run(self, *args, **kwargs):
+            context = self.acquire_context()
+            try:
+                yield from method(context, *args, **kwargs)
+            finally:
+                self.release_context(context)
+    else:
+        @functools.wraps(method)
+        def run(self, *args, **kwargs):
+            context = self.acquire_context()
+            try:
+                return method(context, *args, **kwargs)
+            finally:
+                self.release_context(context)
+    return run
+
+class Reentrant:
+    """
+    LPV_Lexer, LPV_Parser and NodeVisitor keep the state of a run (source, pos, token...) on
+    themselves. To use one of them from many threads at once, every run get a context: the
+    instance itself when it's free, else a copy of it that share everything made in `__init__`
+    (rules, tables...) and only have its own run state. Copies are kept and used again.
+    The copy is shallow: the lists, dicts and other objects set in `__init__` are the same for every
+    context, only the methods and lambdas are bound to the copy. A subclass that change such an object
+    while it run make its own one for every copy in `init_context`:
+        def init_context(self):
+            self.variables = {}
+    """
+    pool_lock = threading.Lock()
+    
+    def acquire_context(self):
+        pool = self.__dict__.get("run_contexts")
+        if pool is None:
+            with Reentrant.pool_lock:
+                pool = self.__dict__.setdefault("run_contexts", [self])
+        try:
+            return pool.pop()
+        except IndexError:
+            return self.new_context()
+    
+    def release_context(self, context):
+        self.run_contexts.append(context)
+    
+    def make_context(self):
+        """A copy of this instance for another run, its methods and lambdas using it are bound to the copy."""
+        context = object.__new__(type(self))
+        # the instance may be running in another thread, copy its attributes in one go
+        attributes = self.__dict__.copy()
+        for name, value in attributes.items():
+            if callable(value):
+                attributes[name] = rebind(value, self, context)
+        context.__dict__.update(attributes)
+        return context
+    
+    def init_context(self):
+        """Called on every copy made by `new_context`, to give it its own mutable state (nothing by default)."""
+    
+    def new_context(self):
+        """A copy of this instance for another run (see make_context), with `init_context` called on it."""
+        context = self.make_context()
+        context.init_context()
+        return context
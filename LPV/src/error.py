@@ -1,68 +1,110 @@
-# MIT License
-
-# Copyright (c) 2021 xp
-
-# Permission is hereby granted, free of charge, to any person obtaining a copy
-# of this software and associated documentation files (the "Software"), to deal
-# in the Software without restriction, including without limitation the rights
-# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
-# copies of the Software, and to permit persons to whom the Software is
-# furnished to do so, subject to the following conditions:
-
-# The above copyright notice and this permission notice shall be included in all
-# copies or substantial portions of the Software.
-
-# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
-# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
-# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
-# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
-# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
-# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
-# SOFTWARE.
-
-class ErrorType:
-    SYNTAX = "SyntaxError"
-    CRASH = "UnexpectedPythonError"
-
-class LPV_Exception(Exception):
-    
-    def __init__(self, **kwargs):
-        """
-        Kwargs:
-            error: str
-            msg: str
-            line: int
-            col: int | optional
-            source: str
-            pointer_width: int | optional
-            when: str | optional
-        """
-        self.error:str = kwargs.pop("error")
-        self.msg:str = kwargs.pop("msg")
-        self.line:int = kwargs.pop("line")
-        self.col:int = kwargs.pop("col") if "col" in kwargs else None
-        self.source:str = kwargs.pop("source")
-        self.pointer_width:int = kwargs.pop("pointer_width") if "pointer_width" in kwargs else 1
-        self.when:str = kwargs.pop("when") if "when" in kwargs else None
-        for attr, value in kwargs.items():
-            setattr(self, attr, value)
-        super().__init__(self.__repr__())
-        
-    def __repr__(self):
-        ln = self.line+1
-        s_ln = len(str(ln))
-        ln_str = self.source.splitlines()[self.line]
-        string = "An Error Has Occurred:" if self.when is None else f"{self.when}::Error Occurred:"
-        string += "\n  "+("─"*s_ln)+"──┬─"+("─"*len(ln_str))+"─"
-        string += "\n   {ln} │ {ln_str} ".format(
-            ln=ln, ln_str=ln_str,
-        )
-        col = "\n"
-        if self.col is not None:
-            col = "\n   {ln_len} │ {space}{pointer}─┤col:{col}│".format(
-                ln_len=" "*s_ln, space=" "*self.col,
-                col=self.col+1,
-                pointer="└"+("┴"*(self.pointer_width-1)),
-            )
-        string += col
-        return string+f"\n{self.error}: {self.msg}"
\ No newline at end of file
+# MIT License
+
+# Copyright (c) 2021 xp
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+class ErrorType:
+    SYNTAX = "SyntaxError"
+    CRASH = "UnexpectedPythonError"
+
+def get_line(source, line:int, encoding:str="utf-8") -> str:
+    """Text of the line `line` (from 0) of `source`, "" when the source has no such line."""
+    if isinstance(source, str):
+        lines = source.splitlines()
+        return lines[line] if 0 <= line < len(lines) else ""
+    # bytes or mmap, look for the line without copying the whole source
+    start = 0
+    for _ in range(line):
+        start = source.find(b"\n", start)+1
+        if start == 0:
+            return ""
+    end = source.find(b"\n", start)
+    if end == -1:
+        end = len(source)
+    return bytes(source[start:end]).rstrip(b"\r").decode(encoding, "replace")
+
+def restore_exception(cls, args: tuple, state: dict):
+    e = cls.__new__(cls)
+    e.args = args
+    e.__dict__.update(state)
+    return e
+
+class LPV_Exception(Exception):
+    
+    def __init__(self, **kwargs):
+        """
+        Kwargs:
+            error: str
+            msg: str
+            line: int | optional if offset and index are given
+            col: int | optional
+            source: str
+            offset: int | optional, resolved to line and col with index
+            index: LineIndex | optional, also used to find the line text
+            pointer_width: int | optional
+            when: str | optional
+            first_line: int | optional, line number of the first line in source
+            first_col: int | optional, column where source start in first_line
+        """
+        self.error:str = kwargs.pop("error")
+        self.msg:str = kwargs.pop("msg")
+        self.index = kwargs.pop("index") if "index" in kwargs else None
+        self.offset:int = kwargs.pop("offset") if "offset" in kwargs else None
+        if kwargs.get("line") is None and self.offset is not None:
+            kwargs["line"], kwargs["col"] = self.index.lc(self.offset)
+        self.line:int = kwargs.pop("line")
+        self.col:int = kwargs.pop("col") if "col" in kwargs else None
+        self.source:str = kwargs.pop("source")
+        self.pointer_width:int = kwargs.pop("pointer_width") if "pointer_width" in kwargs else 1
+        self.when:str = kwargs.pop("when") if "when" in kwargs else None
+        self.first_line:int = kwargs.pop("first_line") if "first_line" in kwargs else 0
+        self.first_col:int = kwargs.pop("first_col") if "first_col" in kwargs else 0
+        for attr, value in kwargs.items():
+            setattr(self, attr, value)
+        super().__init__(self.__repr__())
+        
+    def __repr__(self):
+        ln = self.line+1
+        s_ln = len(str(ln))
+        encoding = getattr(self, "encoding", "utf-8")
+        ln_str = None
+        if self.index is not None and self.index.source is self.source:
+            ln_str = self.index.line_text(self.line, encoding)
+        if ln_str is None:
+            ln_str = get_line(self.source, self.line-self.first_line, encoding)
+        string = "An Error Has Occurred:" if self.when is None else f"{self.when}::Error Occurred:"
+        string += "\n  "+("─"*s_ln)+"──┬─"+("─"*len(ln_str))+"─"
+        string += "\n   {ln} │ {ln_str} ".format(
+            ln=ln, ln_str=ln_str,
+        )
+        col = "\n"
+        if self.col is not None:
+            col = "\n   {ln_len} │ {space}{pointer}─┤col:{col}│".format(
+                ln_len=" "*s_ln,
+                space=" "*(self.col-(self.first_col if self.line == self.first_line else 0)),
+                col=self.col+1,
+                pointer="└"+("┴"*(self.pointer_width-1)),
+            )
+        string += col
+        return string+f"\n{self.error}: {self.msg}"
+    
+    def __reduce__(self):
+        # the kwargs only __init__ can't be called again with self.args
+        return restore_exception, (type(self), self.args, self.__dict__)
\ No newline at end of file
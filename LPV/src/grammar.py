@@ -0,0 +1,225 @@
+# MIT License
+
+# Copyright (c) 2021 xp
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+from LPV.src.token import TokenType
+import hashlib, os, pickle, re
+
+# version of what is saved in `cache_dir`, change it when the table or the productions change
+GRAMMAR_FORMAT = 1
+GRAMMAR_TOKEN = re.compile(r"\s*(?:#[^\n]*|(?P<name>[A-Za-z_]\w*)|(?P<op>->|[:|*+?()])|(?P<bad>\S))")
+
+class Production:
+    """
+    `name: symbols`, a symbol is a TokenType (terminal) or a rule name.
+    Inline productions (made for `*`, `+`, `?` and groups) give their children to the rule using them.
+    """
+    __slots__ = ("name", "symbols", "action", "inline")
+    
+    def __init__(self, name: str, symbols: tuple, action:str=None, inline:bool=False):
+        self.name, self.symbols, self.action, self.inline = name, symbols, action, inline
+    
+    def __repr__(self):
+        return f"{self.name}: "+" ".join(
+            s.name if isinstance(s, TokenType) else s for s in self.symbols
+        )
+
+class Grammar:
+    """
+    LL(1) grammar compiled into a parse table. One rule by line (an alternative can go on the next
+    line starting with `|`), the first rule is where parsing start:
+        expr: term (PLUS term | MINUS term)*     -> binary
+        term: LITERAL | LPAREN expr RPAREN       -> group
+    UPPERCASE names are token types, lowercase names are rules, `*`, `+`, `?` and `( )` work like
+    in a regex and `-> name` call `build_name` of the parser for that alternative.
+    With `cache_dir`, the compiled table is saved there and loaded again for the same grammar.
+    """
+    
+    def __init__(self, text: str, cache_dir:str=None):
+        self.text = text
+        path = None
+        if cache_dir is not None:
+            digest = hashlib.sha1(text.encode()).hexdigest()
+            path = os.path.join(cache_dir, f"grammar_v{GRAMMAR_FORMAT}_{digest}.pickle")
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    self.start, self.productions, self.table = pickle.load(f)
+                return
+        self.productions = []
+        self.start = None
+        self.read(text)
+        self.build_table()
+        if path is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump((self.start, self.productions, self.table), f)
+            os.replace(tmp, path)
+    
+    def read(self, text: str):
+        tokens = []
+        for m in GRAMMAR_TOKEN.finditer(text):
+            if m.group("bad") is not None:
+                raise TypeError(f"Invalid character in grammar: {m.group('bad')!r}")
+            if m.group("name") is not None:
+                tokens.append(("name", m.group("name")))
+            elif m.group("op") is not None:
+                tokens.append(("op", m.group("op")))
+        tokens.append(("end", None))
+        self.tokens, self.pos, self.helpers = tokens, 0, 0
+        while self.tokens[self.pos][0] != "end":
+            kind, name = self.tokens[self.pos]
+            if kind != "name" or self.tokens[self.pos+1] != ("op", ":"):
+                raise TypeError(f"Expected a rule name and ':' in grammar, got {name!r}")
+            if name.isupper():
+                raise TypeError(f"Rule name can't be all uppercase, it's used for token types: {name}")
+            if self.start is None:
+                self.start = name
+            self.pos += 2
+            self.read_alternatives(name, top=True)
+        names = {p.name for p in self.productions}
+        for p in self.productions:
+            for s in p.symbols:
+                if isinstance(s, str) and s not in names:
+                    raise TypeError(f"Rule {s} is used in {p.name} but never defined")
+    
+    def peek(self):
+        return self.tokens[self.pos]
+    
+    def read_alternatives(self, name: str, top:bool=False, inline:bool=False):
+        while True:
+            symbols, action = self.read_sequence(name)
+            if action is not None and top is False:
+                raise TypeError(f"'-> {action}' can only be at the end of an alternative of {name}")
+            self.productions.append(Production(name, symbols, action, inline))
+            if self.peek() != ("op", "|"):
+                return
+            self.pos += 1
+    
+    def helper(self, name: str) -> str:
+        self.helpers += 1
+        return f"{name}__{self.helpers}"
+    
+    def read_sequence(self, name: str):
+        symbols, action = [], None
+        while True:
+            kind, value = self.peek()
+            if kind == "name":
+                # stop before the next rule
+                if self.tokens[self.pos+1] == ("op", ":"):
+                    break
+                self.pos += 1
+                symbol = TokenType(value) if value.isupper() else value
+            elif value == "(":
+                self.pos += 1
+                symbol = self.helper(name)
+                self.read_alternatives(symbol, inline=True)
+                if self.peek() != ("op", ")"):
+                    raise TypeError(f"Expected ')' in rule {name}")
+                self.pos += 1
+            elif value == "->":
+                self.pos += 1
+                kind, action = self.peek()
+                if kind != "name":
+                    raise TypeError(f"Expected a name after '->' in rule {name}")
+                self.pos += 1
+                break
+            else:
+                break
+            kind, value = self.peek()
+            if value in ("*", "+", "?"):
+                self.pos += 1
+                symbols.append(self.repeat(name, symbol, value))
+            else:
+                symbols.append(symbol)
+        return tuple(symbols), action
+    
+    def repeat(self, name: str, symbol, op: str) -> str:
+        helper = self.helper(name)
+        if op == "?":
+            self.productions.append(Production(helper, (symbol,), inline=True))
+            self.productions.append(Production(helper, (), inline=True))
+        elif op == "*":
+            self.productions.append(Production(helper, (symbol, helper), inline=True))
+            self.productions.append(Production(helper, (), inline=True))
+        else:
+            rest = self.repeat(name, symbol, "*")
+            self.productions.append(Production(helper, (symbol, rest), inline=True))
+        return helper
+    
+    def build_table(self):
+        """FIRST and FOLLOW sets of every rule, then the table rule -> token type -> production."""
+        names = []
+        for p in self.productions:
+            if p.name not in names:
+                names.append(p.name)
+        first = {name: set() for name in names}
+        nullable = set()
+        def first_of(symbols) -> tuple:
+            result = set()
+            for s in symbols:
+                if isinstance(s, TokenType):
+                    result.add(s)
+                    return result, False
+                result |= first[s]
+                if s not in nullable:
+                    return result, False
+            return result, True
+        changed = True
+        while changed:
+            changed = False
+            for p in self.productions:
+                f, empty = first_of(p.symbols)
+                if not f <= first[p.name]:
+                    first[p.name] |= f
+                    changed = True
+                if empty and p.name not in nullable:
+                    nullable.add(p.name)
+                    changed = True
+        # None is the end of the tokens
+        follow = {name: set() for name in names}
+        follow[self.start].add(None)
+        changed = True
+        while changed:
+            changed = False
+            for p in self.productions:
+                for i, s in enumerate(p.symbols):
+                    if isinstance(s, TokenType):
+                        continue
+                    f, empty = first_of(p.symbols[i+1:])
+                    if empty:
+                        f = f | follow[p.name]
+                    if not f <= follow[s]:
+                        follow[s] |= f
+                        changed = True
+        self.first, self.follow, self.nullable = first, follow, nullable
+        self.table = {name: {} for name in names}
+        for i, p in enumerate(self.productions):
+            f, empty = first_of(p.symbols)
+            if empty:
+                f = f | follow[p.name]
+            row = self.table[p.name]
+            for t in f:
+                if t in row and row[t] != i:
+                    raise TypeError(
+                        f"Grammar is not LL(1), {p.name.split('__')[0]} can use "
+                        f"'{self.productions[row[t]]}' or '{p}' on {'EOF' if t is None else t.name}"
+                    )
+                row[t] = i
\ No newline at end of file
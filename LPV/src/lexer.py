@@ -1,296 +1,778 @@
-# MIT License
-
-# Copyright (c) 2021 xp
-
-# Permission is hereby granted, free of charge, to any person obtaining a copy
-# of this software and associated documentation files (the "Software"), to deal
-# in the Software without restriction, including without limitation the rights
-# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
-# copies of the Software, and to permit persons to whom the Software is
-# furnished to do so, subject to the following conditions:
-
-# The above copyright notice and this permission notice shall be included in all
-# copies or substantial portions of the Software.
-
-# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
-# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
-# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
-# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
-# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
-# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
-# SOFTWARE.
-from LPV.src.token import Token, TokenTree
-from LPV.src.error import ErrorType, LPV_Exception
-from typing import Callable, Union
-import traceback, inspect
-
-def islambda(obj):
-    l = lambda:None
-    return isinstance(obj, type(l)) and obj.__name__ == l.__name__
-
-class LPV_Lexer:
-    initiliazing = False
-    def __init__(self):
-        self.can_count = False
-        self.count_char = -1
-        if not "rules" in self.__dict__:
-            raise TypeError("no self.rules found")
-        r = []
-        for k, v in (self.rules.items()) if isinstance(self.rules, dict) else (self.rules):
-            if isinstance(v, str):
-                r.append((k, getattr(self, ('lex_'+v) if not v.startswith("lex_") else v)))
-            elif isinstance(v, Callable):
-                if not v.__name__.startswith("lex_"):
-                    if not islambda(v):
-                        raise TypeError(
-                            f"self.rules rule function must start with 'lex_' or can be lambda: {v.__name__}"
-                        )
-                r.append((k, v))
-            else:
-                raise TypeError(
-                    f"{v} is not Callable or str"
-                )
-        if not r:
-            raise TypeError(
-                "self.rules can't be empty"
-            )
-        self.rules = tuple(r)
-        self.name = type(self).__name__
-        self.initiliazing = True
-    
-    def init(self, source: str):
-        self.source, self.len_s = source, len(source)
-        self.pos, self.char = -1, None
-        self.chars = ""
-        self.line, self.col = 0, -1
-        self.next_char()
-    
-    def throw_error(self, error, msg, pointer_width:int=1, **kwargs):
-        raise LPV_Exception(
-            **{"error":error, "msg":msg,
-            "line":self.line, "col":self.col,
-            "source":self.source, "when":"Lexer",
-            "pointer_width":pointer_width, **kwargs}
-        )
-    
-    def increase_count(self, num:int=1):
-        if self.can_count is True:
-            self.count_char += num
-    def reset_count(self):
-        if self.can_count is True:
-            self.count_char = 0
-    def get_count(self):
-        if self.can_count is True:
-            return (self.count_char,)
-        return ()
-    
-    def next_char(self):
-        self.pos += 1
-        self.col += 1
-        if self.pos >= self.len_s:
-            self.char = None
-        else:
-            self.char = self.source[self.pos]
-            if self.char == "\n":
-                self.line += 1
-                self.col = -1
-    
-    def peek(self, step=1):
-        pos = self.pos+step
-        if pos >= self.len_s:
-            return None
-        return self.source[pos]
-    
-    def enter(self, step=1):
-        c = []
-        for _ in range(step):
-            if self.char is None:
-                self.throw_error(
-                    ErrorType.SYNTAX,
-                    "Unexpected EOF while scanning",
-                    col=self.col-1
-                )
-            c.append(self.char)
-            self.chars += self.char
-            self.next_char()
-    
-    def skip(self, step=1):
-        c = []
-        for _ in range(step):
-            if self.char is None:
-                self.throw_error(
-                    ErrorType.SYNTAX,
-                    "Unexpected EOF while scanning",
-                    col=self.col-1
-                )
-            c.append(self.char)
-            self.next_char()
-        return c
-    
-    def clear(self):
-        c = self.chars
-        self.chars = ""
-        return c
-    
-    def enter_clear(self, step=1):
-        self.enter(step=step)
-        return self.clear()
-    
-    def skip_clear(self, step=1):
-        self.skip(step=step)
-        return self.clear()
-    
-    def enter_while(self, expr: Union[tuple, list, set, str, Callable]):
-        while not self.is_eof() and self.match(expr):
-            self.enter()
-    
-    def skip_while(self, expr: Union[tuple, list, set, str, Callable]):
-        while not self.is_eof() and self.match(expr):
-            self.skip()
-    
-    def enter_if(self, obj: Union[tuple, list, set, str, Callable]):
-        if self.match(obj):
-            return self.enter()
-        self.throw_error(
-            error=ErrorType.SYNTAX,
-            msg=f"Unexpected "+(
-                "character: "+self.char if self.char is not None
-                else (
-                    "EOF while scanning"
-                )
-            )
-        )
-
-    def skip_if(self, obj: Union[tuple, list, set, str, Callable]):
-        if self.match(obj):
-            return self.skip()
-        self.throw_error(
-            error=ErrorType.SYNTAX,
-            msg=f"Unexpected "+(
-                "character: "+self.char if self.char is not None
-                else (
-                    "EOF while scanning"
-                )
-            )
-        )
-    
-    def slice(self, step:int, start:int=0):
-        r = ""
-        for i in range(step):
-            c = self.peek(start+i)
-            if c is not None:
-                r += c
-        return r
-    
-    def match_string(self, string: str, start:int=0, incase_sensitive:bool=False):
-        slc = self.slice(len(string), start)
-        r = (string == slc) if incase_sensitive is False else (string.lower() == slc.lower())
-        if r is True:
-            self.increase_count(len(string))
-        return r
-    
-    def match_optional(self, *objs, **kwargs):
-        for o in objs:
-            if self.match(o, **kwargs):
-                return True
-        return False
-    
-    def match_optional(self, *objs, **kwargs):
-        for o in objs:
-            if self.match(o, **kwargs):
-                return True
-        return False
-
-    def match_optional_incase(self, *objs, **kwargs):
-        kwargs["incase_sensitive"] = True
-        for o in objs:
-            if self.match(o, **kwargs):
-                return True
-        return False
-
-    def match_forward(self, *objs):
-        for i, o in enumerate(objs):
-            if not self.match(o, start=i):
-                return False
-        return True
-    
-    def match(self, obj: Union[tuple, list, set, str, Callable], **kwargs):
-        if isinstance(obj, str):
-            return self.match_string(obj, **kwargs)
-        elif isinstance(obj, tuple):
-            return self.match_forward(*obj)
-        elif isinstance(obj, list):
-            return self.match_optional(*obj, **kwargs)
-        elif isinstance(obj, set):
-            return self.match_optional_incase(*obj, **kwargs)
-        elif isinstance(obj, Callable):
-            arg = self.peek(kwargs["start"]) if "start" in kwargs else self.char
-            if arg is None:
-                return False
-            r = True if obj(arg) else False
-            if r is True:
-                self.increase_count()
-            return r
-        else:
-            raise TypeError(f"Only accept type tuple, list, str or Callable: {obj}")
-    
-    def is_eof(self):
-        return self.char is None
-    
-    def put(self, string: str):
-        self.chars += string
-    
-    def lex(self, source: str, ignore_un_update_pos:bool=False, crash_handler:Callable=print):
-        if self.initiliazing is False:
-            raise TypeError(
-                f"{type(self).__name__} is not fully initiliaze. Forgot super().__init__() in the __init__?"
-            )
-        self.init(source)
-        tree = []
-        last_items = self.rules[-1]
-        try:
-            while not self.is_eof():
-                lc = self.line, self.col
-                for rule, func in self.rules:
-                    if len(inspect.signature(func).parameters) < 1:
-                        self.can_count = False
-                    else:
-                        self.can_count = True
-                    self.reset_count()
-                    if self.match(rule):
-                        if ignore_un_update_pos is False:
-                            p = self.pos
-                            r = func(*self.get_count())
-                            if self.pos == p:
-                                raise TypeError(
-                                    f"{func.__name__} must move to the next position atleast once"
-                                    "(avoiding infinity loop)"
-                                )
-                        else:
-                            r = func()
-                        if r is None:
-                            break
-                        if not isinstance(r, Token):
-                            raise TypeError("function must return Token object")
-                        if None in (r.line, r.col):
-                            r.set_lc(*lc)
-                        tree.append(r)
-                        break
-                    if (rule, func) == last_items:
-                        self.throw_error(
-                            ErrorType.SYNTAX,
-                            f"Invalid character: '{self.char}'",
-                            char=self.char
-                        )
-        except LPV_Exception as e:
-            raise e
-        except Exception as e:
-            if crash_handler is print:
-                crash_handler(traceback.format_exc())
-            else:
-                crash_handler(e)
-            self.throw_error(
-                ErrorType.CRASH,
-                "Uh oh. Looks like the lexer got an Python Error."
-            )
-        return TokenTree(self.source, *tree)
\ No newline at end of file
+# MIT License
+
+# Copyright (c) 2021 xp
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+from LPV.src.token import Token, TokenTree, CompactTokenTree, StreamTokenTree
+from LPV.src.error import ErrorType, LPV_Exception
+from LPV.src.rule import Rule, RuleGroup, CharClass, fuse_rules
+from LPV.src.context import Reentrant, reentrant, rebind
+from LPV.src.position import LineIndex
+from LPV.src.batch import init_worker, lex_chunk
+from concurrent.futures import ProcessPoolExecutor
+from typing import IO, Callable, Iterable, Iterator, Union
+import traceback, re, mmap
+
+def islambda(obj):
+    l = lambda:None
+    return isinstance(obj, type(l)) and obj.__name__ == l.__name__
+
+class LPV_Lexer(Reentrant):
+    initiliazing = False
+    # where `lex_parallel` can cut the source, right after a match of this (str or re.Pattern)
+    split_at = None
+    def __init__(self, master_pattern:bool=False, bytes_mode:bool=False, encoding:str="utf-8"):
+        self.master_pattern = master_pattern
+        self.bytes_mode, self.encoding = bytes_mode, encoding
+        self.can_count = False
+        self.count_char = -1
+        if not "rules" in self.__dict__:
+            raise TypeError("no self.rules found")
+        r = []
+        for k, v in (self.rules.items()) if isinstance(self.rules, dict) else (self.rules):
+            if isinstance(v, str):
+                r.append((k, getattr(self, ('lex_'+v) if not v.startswith("lex_") else v)))
+            elif isinstance(v, Callable):
+                if not v.__name__.startswith("lex_"):
+                    if not islambda(v):
+                        raise TypeError(
+                            f"self.rules rule function must start with 'lex_' or can be lambda: {v.__name__}"
+                        )
+                r.append((k, v))
+            else:
+                raise TypeError(
+                    f"{v} is not Callable or str"
+                )
+        if not r:
+            raise TypeError(
+                "self.rules can't be empty"
+            )
+        self.rules = tuple(r)
+        self.compile_rules()
+        self.name = type(self).__name__
+        self.initiliazing = True
+    
+    def compile_rules(self):
+        encoding = self.encoding if self.bytes_mode is True else None
+        self.compiled_rules = tuple(Rule(k, v, encoding) for k, v in self.rules)
+        self.steps = (
+            fuse_rules(self.compiled_rules, encoding) if self.master_pattern is True
+            else self.compiled_rules
+        )
+        self.dispatch = {}
+        chars = set()
+        for step in self.steps:
+            chars |= step.matcher.start_chars()
+        for c in chars:
+            self.get_candidates(c)
+    
+    def get_candidates(self, char) -> tuple:
+        candidates = self.dispatch.get(char)
+        if candidates is None:
+            candidates = tuple(
+                step for step in self.steps if step.matcher.can_start(char)
+            )
+            self.dispatch[char] = candidates
+        return candidates
+    
+    def make_context(self):
+        context = Reentrant.make_context(self)
+        rules = {rule: rule.bind(self, context) for rule in self.compiled_rules}
+        context.rules = tuple((k, rebind(v, self, context)) for k, v in self.rules)
+        context.compiled_rules = tuple(rules.values())
+        context.steps = tuple(
+            RuleGroup(tuple(rules[r] for r in step.rules), step.matcher.pattern) if step.grouped is True
+            else rules[step] for step in self.steps
+        )
+        steps = dict(zip(self.steps, context.steps))
+        context.dispatch = {
+            char: tuple(steps[step] for step in candidates) for char, candidates in self.dispatch.copy().items()
+        }
+        return context
+    
+    def init(self, source: str, feed:Iterator=None, window:int=65536, index:LineIndex=None):
+        self.source, self.len_s = source, len(source)
+        self.empty = b"" if self.bytes_mode is True else ""
+        self.newline = b"\n" if self.bytes_mode is True else "\n"
+        self.feed, self.window = feed, window
+        self.streaming = feed is not None
+        if index is None:
+            index = LineIndex() if self.streaming else LineIndex(source)
+        self.index = index
+        self.offset, self.base_line, self.base_col = 0, 0, 0
+        self.pos, self.char = -1, None
+        self.mark, self.pieces = None, []
+        self.next_char()
+    
+    @property
+    def line(self) -> int:
+        return self.index.lc(self.offset+self.pos)[0]
+    
+    @property
+    def col(self) -> int:
+        return self.index.lc(self.offset+self.pos)[1]
+    
+    def fill(self, upto:int) -> bool:
+        """Read chunks from the feed until `upto` is inside the window."""
+        old = self.len_s
+        chunks = []
+        while self.feed is not None and self.len_s <= upto:
+            chunk = next(self.feed, None)
+            if chunk is None:
+                self.feed = None
+                break
+            self.index.add(chunk, self.offset+self.len_s)
+            chunks.append(chunk)
+            self.len_s += len(chunk)
+        if not chunks:
+            return False
+        self.source += self.empty.join(chunks)
+        if self.pos >= old:
+            self.char = self.source[self.pos:self.pos+1] if self.pos < self.len_s else None
+        return True
+    
+    def available(self, end:int) -> bool:
+        if end > self.len_s and self.feed is not None:
+            self.fill(end-1)
+        return end <= self.len_s
+    
+    def trim(self):
+        """Drop the part of the window before the current token, keeping its line if possible."""
+        cut = self.source.rfind(self.newline, 0, self.pos)+1
+        if cut == 0 or self.pos-cut > self.window:
+            if self.char == self.newline:
+                return
+            cut = self.pos
+            base_line, base_col = self.line, self.col
+        else:
+            base_line, base_col = self.line-1 if self.char == self.newline else self.line, 0
+        if cut == 0:
+            return
+        self.base_line, self.base_col = base_line, base_col
+        self.source = self.source[cut:]
+        self.len_s = len(self.source)
+        self.offset += cut
+        self.pos -= cut
+        self.index.drop(self.offset)
+    
+    @property
+    def chars(self) -> str:
+        if self.mark is None:
+            return self.empty.join(self.pieces)
+        if not self.pieces:
+            return self.source[self.mark:self.pos]
+        return self.empty.join(self.pieces)+self.source[self.mark:self.pos]
+    
+    @chars.setter
+    def chars(self, value: str):
+        self.mark, self.pieces = None, [value] if value else []
+    
+    def flush_chars(self):
+        self.pieces.append(self.source[self.mark:self.pos])
+        self.mark = None
+    
+    def throw_error(self, error, msg, pointer_width:int=1, **kwargs):
+        line, col = self.index.lc(self.offset+self.pos)
+        raise LPV_Exception(
+            **{"error":error, "msg":msg,
+            "line":line, "col":col,
+            "source":self.source, "when":"Lexer",
+            "index":None if self.streaming else self.index,
+            "first_line":self.base_line, "first_col":self.base_col,
+            "encoding":self.encoding,
+            "pointer_width":pointer_width, **kwargs}
+        )
+    
+    def increase_count(self, num:int=1):
+        if self.can_count is True:
+            self.count_char += num
+    def reset_count(self):
+        if self.can_count is True:
+            self.count_char = 0
+    def get_count(self):
+        if self.can_count is True:
+            return (self.count_char,)
+        return ()
+    
+    def next_char(self):
+        if self.mark is not None:
+            self.flush_chars()
+        self.pos += 1
+        if self.pos >= self.len_s:
+            self.char = None
+            if self.feed is not None:
+                self.fill(self.pos)
+        else:
+            self.char = self.source[self.pos:self.pos+1]
+    
+    def forward(self, step:int):
+        end = self.pos+step
+        self.pos = end
+        if end < self.len_s:
+            self.char = self.source[end:end+1]
+        else:
+            self.char = None
+            if self.feed is not None:
+                self.fill(end)
+    
+    def peek(self, step=1):
+        pos = self.pos+step
+        if pos >= self.len_s and not self.available(pos+1):
+            return None
+        return self.source[pos:pos+1]
+    
+    def enter(self, step=1):
+        if self.mark is None:
+            self.mark = self.pos
+        if not self.available(self.pos+step):
+            self.forward(max(self.len_s-self.pos, 0))
+            self.throw_error(
+                ErrorType.SYNTAX,
+                "Unexpected EOF while scanning",
+                col=self.col-1
+            )
+        self.forward(step)
+    
+    def skip(self, step=1):
+        if self.mark is not None:
+            self.flush_chars()
+        if not self.available(self.pos+step):
+            self.forward(max(self.len_s-self.pos, 0))
+            self.throw_error(
+                ErrorType.SYNTAX,
+                "Unexpected EOF while scanning",
+                col=self.col-1
+            )
+        c = list(self.source[self.pos:self.pos+step])
+        self.forward(step)
+        return c
+    
+    def clear(self):
+        c = self.chars
+        self.mark, self.pieces = None, []
+        return c
+    
+    def enter_clear(self, step=1):
+        self.enter(step=step)
+        return self.clear()
+    
+    def skip_clear(self, step=1):
+        self.skip(step=step)
+        return self.clear()
+    
+    def enter_while(self, expr: Union[tuple, list, set, str, CharClass, Callable]):
+        if isinstance(expr, CharClass):
+            if self.mark is None:
+                self.mark = self.pos
+            # the loop only go around again when the run reach the end of a streaming window
+            while not self.is_eof():
+                count = expr.run(self.source, self.pos)
+                if count == 0:
+                    break
+                self.increase_count(count)
+                self.forward(count)
+            return
+        while not self.is_eof() and self.match(expr):
+            self.enter()
+    
+    def skip_while(self, expr: Union[tuple, list, set, str, CharClass, Callable]):
+        if isinstance(expr, CharClass):
+            if self.mark is not None:
+                self.flush_chars()
+            while not self.is_eof():
+                count = expr.run(self.source, self.pos)
+                if count == 0:
+                    break
+                self.increase_count(count)
+                self.forward(count)
+            return
+        while not self.is_eof() and self.match(expr):
+            self.skip()
+    
+    def enter_if(self, obj: Union[tuple, list, set, str, Callable]):
+        if self.match(obj):
+            return self.enter()
+        self.throw_error(
+            error=ErrorType.SYNTAX,
+            msg=f"Unexpected "+(
+                f"character: {self.char}" if self.char is not None
+                else (
+                    "EOF while scanning"
+                )
+            )
+        )
+
+    def skip_if(self, obj: Union[tuple, list, set, str, Callable]):
+        if self.match(obj):
+            return self.skip()
+        self.throw_error(
+            error=ErrorType.SYNTAX,
+            msg=f"Unexpected "+(
+                f"character: {self.char}" if self.char is not None
+                else (
+                    "EOF while scanning"
+                )
+            )
+        )
+    
+    def slice(self, step:int, start:int=0):
+        pos = self.pos+start
+        if pos >= 0:
+            self.available(pos+step)
+            return self.source[pos:pos+step]
+        r = ""
+        for i in range(step):
+            c = self.peek(start+i)
+            if c is not None:
+                r += c
+        return r
+    
+    def match_string(self, string: str, start:int=0, incase_sensitive:bool=False):
+        if self.bytes_mode is True and isinstance(string, str):
+            string = string.encode(self.encoding)
+        pos = self.pos+start
+        if incase_sensitive is False and pos >= 0:
+            self.available(pos+len(string))
+            if self.bytes_mode is False:
+                r = self.source.startswith(string, pos)
+            else:
+                r = self.source[pos:pos+len(string)] == string
+        else:
+            slc = self.slice(len(string), start)
+            r = (string == slc) if incase_sensitive is False else (string.lower() == slc.lower())
+        if r is True:
+            self.increase_count(len(string))
+        return r
+    
+    def match_optional(self, *objs, **kwargs):
+        for o in objs:
+            if self.match(o, **kwargs):
+                return True
+        return False
+    
+    def match_optional(self, *objs, **kwargs):
+        for o in objs:
+            if self.match(o, **kwargs):
+                return True
+        return False
+
+    def match_optional_incase(self, *objs, **kwargs):
+        kwargs["incase_sensitive"] = True
+        for o in objs:
+            if self.match(o, **kwargs):
+                return True
+        return False
+
+    def match_forward(self, *objs):
+        for i, o in enumerate(objs):
+            if not self.match(o, start=i):
+                return False
+        return True
+    
+    def match(self, obj: Union[tuple, list, set, str, Callable], **kwargs):
+        if isinstance(obj, (str, bytes)):
+            return self.match_string(obj, **kwargs)
+        elif isinstance(obj, tuple):
+            return self.match_forward(*obj)
+        elif isinstance(obj, list):
+            return self.match_optional(*obj, **kwargs)
+        elif isinstance(obj, set):
+            return self.match_optional_incase(*obj, **kwargs)
+        elif isinstance(obj, re.Pattern):
+            m = obj.match(self.source, self.pos+kwargs.get("start", 0))
+            if m is None:
+                return False
+            self.increase_count(m.end()-m.start())
+            return True
+        elif isinstance(obj, Callable):
+            arg = self.peek(kwargs["start"]) if "start" in kwargs else self.char
+            if arg is None:
+                return False
+            r = True if obj(arg) else False
+            if r is True:
+                self.increase_count()
+            return r
+        else:
+            raise TypeError(f"Only accept type tuple, list, str, re.Pattern or Callable: {obj}")
+    
+    def is_eof(self):
+        return self.char is None
+    
+    def put(self, string: str):
+        if self.mark is not None:
+            self.flush_chars()
+        self.pieces.append(string)
+    
+    def scan(self, ignore_un_update_pos:bool=False):
+        dispatch = self.dispatch
+        lookahead = max(
+            [self.window]+[r.matcher.width for r in self.compiled_rules if r.matcher.width is not None]
+        )
+        while not self.is_eof():
+            if self.feed is not None:
+                if self.mark is None and self.pos > self.window:
+                    self.trim()
+                if self.len_s-self.pos <= lookahead:
+                    self.fill(self.pos+lookahead)
+            start = self.pos
+            candidates = dispatch.get(self.char)
+            if candidates is None:
+                candidates = self.get_candidates(self.char)
+            for rule in candidates:
+                count = rule.matcher.match(self.source, self.pos)
+                if count is not None:
+                    break
+            else:
+                char = self.char
+                if self.bytes_mode is True:
+                    char = char.decode(self.encoding, "replace")
+                self.throw_error(
+                    ErrorType.SYNTAX,
+                    f"Invalid character: '{char}'",
+                    char=self.char
+                )
+            if rule.grouped is True:
+                rule, count = count
+            if self.feed is not None and self.pos+count >= self.len_s:
+                # the match touch the end of the window, it may be longer
+                if self.fill(self.len_s+self.window):
+                    continue
+            func = rule.func
+            self.can_count = rule.arity > 0
+            self.count_char = count
+            if rule.consume is True:
+                if self.mark is not None:
+                    self.flush_chars()
+                text = self.source[start:start+count]
+                self.forward(count)
+                span = (self.offset+start, self.offset+start+count)
+                r = func(*(text, span)[:rule.arity])
+            elif ignore_un_update_pos is False:
+                p = self.pos
+                r = func(*self.get_count())
+                if self.pos == p:
+                    raise TypeError(
+                        f"{func.__name__} must move to the next position atleast once"
+                        "(avoiding infinity loop)"
+                    )
+            else:
+                r = func()
+            if r is None:
+                continue
+            if not isinstance(r, Token):
+                raise TypeError("function must return Token object")
+            if r.start is None:
+                r.set_span(self.offset+start, self.offset+self.pos)
+            if self.streaming is True:
+                # the index forget old lines while streaming, so resolve the position now
+                if "line" not in r.__dict__:
+                    r.set_lc(*self.index.lc(r.start))
+            elif r.index is None:
+                r.index = self.index
+            if self.bytes_mode is True:
+                r.encoding = self.encoding
+            yield r
+    
+    @reentrant
+    def lex_iter(self, chunks: Union[str, Iterable[str], IO], window:int=65536,
+                 ignore_un_update_pos:bool=False, crash_handler:Callable=print):
+        """
+        Lex a file object or an iterable of text chunks and yield every Token
+        as soon as it is produced. Only a window of the source around the
+        current token is kept in memory. `window` is the size of the
+        lookahead and of every read from a file object.
+        """
+        if self.initiliazing is False:
+            raise TypeError(
+                f"{type(self).__name__} is not fully initiliaze. Forgot super().__init__() in the __init__?"
+            )
+        if isinstance(chunks, str):
+            chunks = (chunks,)
+        elif isinstance(chunks, (bytes, bytearray)):
+            chunks = (bytes(chunks),)
+        elif hasattr(chunks, "read"):
+            read = chunks.read
+            chunks = iter(lambda: read(window), b"" if self.bytes_mode is True else "")
+        self.init(b"" if self.bytes_mode is True else "", feed=iter(chunks), window=window)
+        yield from self.guard(self.scan(ignore_un_update_pos), crash_handler)
+    
+    def guard(self, tokens: Iterator[Token], crash_handler:Callable=print):
+        """Yield from `tokens`, a Python error while lexing is given to `crash_handler` and raised as a CRASH."""
+        try:
+            yield from tokens
+        except LPV_Exception as e:
+            raise e
+        except Exception as e:
+            if crash_handler is print:
+                crash_handler(traceback.format_exc())
+            else:
+                crash_handler(e)
+            self.throw_error(
+                ErrorType.CRASH,
+                "Uh oh. Looks like the lexer got an Python Error."
+            )
+    
+    @reentrant
+    def lex(self, source: str, ignore_un_update_pos:bool=False, crash_handler:Callable=print,
+            compact:bool=False):
+        if self.initiliazing is False:
+            raise TypeError(
+                f"{type(self).__name__} is not fully initiliaze. Forgot super().__init__() in the __init__?"
+            )
+        if self.bytes_mode is True and isinstance(source, str):
+            source = source.encode(self.encoding)
+        self.init(source)
+        try:
+            if compact is True:
+                tree = CompactTokenTree(self.source, index=self.index)
+                tree.extend(self.scan(ignore_un_update_pos))
+            else:
+                tree = TokenTree(self.source, *self.scan(ignore_un_update_pos), index=self.index)
+        except LPV_Exception as e:
+            raise e
+        except Exception as e:
+            if crash_handler is print:
+                crash_handler(traceback.format_exc())
+            else:
+                crash_handler(e)
+            self.throw_error(
+                ErrorType.CRASH,
+                "Uh oh. Looks like the lexer got an Python Error."
+            )
+        return tree
+    
+    def lex_lazy(self, source: str, ignore_un_update_pos:bool=False, crash_handler:Callable=print,
+                 size:int=64) -> StreamTokenTree:
+        """
+        Like `lex` but a token is only lexed when the parser (or `next_token`/`peek`) ask for it,
+        and only a buffer of tokens is kept (see StreamTokenTree). The lexer stop where the parser stop,
+        an error at the start of a big source is found without lexing the rest.
+        """
+        if self.initiliazing is False:
+            raise TypeError(
+                f"{type(self).__name__} is not fully initiliaze. Forgot super().__init__() in the __init__?"
+            )
+        if self.bytes_mode is True and isinstance(source, str):
+            source = source.encode(self.encoding)
+        index = LineIndex(source)
+        return StreamTokenTree(
+            source, self.stream(source, index, ignore_un_update_pos, crash_handler), index=index, size=size
+        )
+    
+    @reentrant
+    def stream(self, source, index:LineIndex, ignore_un_update_pos:bool, crash_handler:Callable):
+        """Tokens of `lex_lazy`, the lexer is only used from the first token to the last one."""
+        self.init(source, index=index)
+        yield from self.guard(self.scan(ignore_un_update_pos), crash_handler)
+    
+    @reentrant
+    def relex(self, old_tree: TokenTree, edit_start:int, edit_end:int, new_text: str,
+              ignore_un_update_pos:bool=False, crash_handler:Callable=print):
+        """
+        Lex `old_tree.source` after `source[edit_start:edit_end]` is replaced with `new_text`.
+        The lexer restart one token before the edit and stop as soon as a new token
+        line up with an old one, the rest of the old tokens are reused with their
+        positions shifted (the old tree shouldn't be used anymore).
+        The returned TokenTree has `reused` and `rescanned` token counts.
+        """
+        if self.initiliazing is False:
+            raise TypeError(
+                f"{type(self).__name__} is not fully initiliaze. Forgot super().__init__() in the __init__?"
+            )
+        old = old_tree.tokens
+        source = old_tree.source[:edit_start]+new_text+old_tree.source[edit_end:]
+        delta = len(new_text)-(edit_end-edit_start)
+        # first token that end at or after the edit
+        lo, hi = 0, len(old)
+        while lo < hi:
+            mid = (lo+hi)//2
+            if old[mid].end < edit_start:
+                lo = mid+1
+            else:
+                hi = mid
+        keep = max(lo-1, 0)
+        self.init(source)
+        if keep > 0:
+            self.pos = old[keep].start
+            self.char = source[self.pos:self.pos+1] or None
+        new, j, synced = [], lo, False
+        try:
+            scanner = self.scan(ignore_un_update_pos)
+            for token in scanner:
+                if token.start >= edit_start+len(new_text):
+                    while j < len(old) and old[j].start+delta < token.start:
+                        j += 1
+                    if (j < len(old) and old[j].start+delta == token.start
+                        and old[j].end+delta == token.end and old[j] == token):
+                        synced = True
+                        break
+                new.append(token)
+            scanner.close()
+        except LPV_Exception as e:
+            raise e
+        except Exception as e:
+            if crash_handler is print:
+                crash_handler(traceback.format_exc())
+            else:
+                crash_handler(e)
+            self.throw_error(
+                ErrorType.CRASH,
+                "Uh oh. Looks like the lexer got an Python Error."
+            )
+        rest = old[j:] if synced is True else ()
+        shift = None
+        if rest:
+            first = rest[0]
+            line, d_line, d_col = first.line, token.line-first.line, token.col-first.col
+            shift = (delta, line, d_line, d_col)
+            for t in rest:
+                if "line" in t.__dict__:
+                    # position set by the rule function itself
+                    if t.line == line:
+                        t.col += d_col
+                    t.line += d_line
+                t.start, t.end = t.start+delta, t.end+delta
+                t.index = self.index
+        tree = TokenTree(source, *old[:keep], *new, *rest, index=self.index)
+        tree.reused, tree.rescanned = keep+len(rest), len(new)+synced
+        # old tokens edit[0] to edit[1] are now tokens edit[0] to edit[2], for `LPV_Parser.reparse`
+        tree.edit = (keep, len(old)-len(rest), keep+len(new))
+        tree.shift = shift
+        return tree
+    
+    def lex_file(self, path: str, ignore_un_update_pos:bool=False, crash_handler:Callable=print,
+                 compact:bool=False):
+        """
+        Lex a file. In bytes mode the file is memory mapped and lexed without
+        reading it into memory, otherwise it is read and decoded with `self.encoding`.
+        """
+        if self.bytes_mode is False:
+            with open(path, encoding=self.encoding) as f:
+                source = f.read()
+        else:
+            with open(path, "rb") as f:
+                try:
+                    source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except ValueError:
+                    # empty file can't be mapped
+                    source = b""
+        return self.lex(source, ignore_un_update_pos, crash_handler, compact)
+    
+    def is_boundary(self, source, pos:int) -> bool:
+        """
+        Called for every place `split_at` found, return False if the source can't be cut at
+        `pos` (like inside a string or a comment). No token may go across a boundary.
+        """
+        return True
+    
+    def split(self, source, size:int) -> list:
+        """Offsets of the chunks `lex_parallel` make, each one about `size` long."""
+        pattern = self.split_at
+        if self.bytes_mode is True and isinstance(pattern, str):
+            pattern = pattern.encode(self.encoding)
+        if not isinstance(pattern, re.Pattern):
+            pattern = re.compile(re.escape(pattern))
+        cuts, len_s = [0], len(source)
+        pos = size
+        while pos < len_s:
+            m = pattern.search(source, pos)
+            while m is not None and not self.is_boundary(source, m.end()):
+                m = pattern.search(source, max(m.end(), m.start()+1))
+            if m is None or m.end() >= len_s:
+                break
+            cuts.append(m.end())
+            pos = m.end()+size
+        return cuts
+    
+    def lex_parallel(self, source, workers:int=None, chunk_size:int=1<<20, verify:bool=False,
+                     crash_handler:Callable=print, compact:bool=False, factory:Callable=None):
+        """
+        Lex a big source in chunks, cut where `split_at` and `is_boundary` allow, in a pool of
+        processes. Every worker make its lexer once with `factory()` (`type(self)` by default).
+        Return the same TokenTree as `lex`, with `verify=True` the source is lexed by `lex` too
+        and a TypeError is raised if the trees are not the same (the boundaries are not safe).
+        """
+        if self.split_at is None:
+            raise TypeError(f"{type(self).__name__}.split_at must be set to use lex_parallel")
+        if self.bytes_mode is True and isinstance(source, str):
+            source = source.encode(self.encoding)
+        cuts = self.split(source, chunk_size)
+        if len(cuts) == 1:
+            return self.lex(source, crash_handler=crash_handler, compact=compact)
+        ends = cuts[1:]+[len(source)]
+        factory = type(self) if factory is None else factory
+        with ProcessPoolExecutor(
+            workers, initializer=init_worker, initargs=(factory, None, None, False, crash_handler)
+        ) as executor:
+            futures = [executor.submit(lex_chunk, source[start:end]) for start, end in zip(cuts, ends)]
+            parts = []
+            for start, end, future in zip(cuts, ends, futures):
+                try:
+                    parts.append(future.result())
+                except LPV_Exception:
+                    for f in futures:
+                        f.cancel()
+                else:
+                    continue
+                # lex the chunk again in the whole source to raise the error with its real position
+                lexer = self.acquire_context()
+                try:
+                    lexer.init(source)
+                    lexer.pos, lexer.char = start, source[start:start+1]
+                    for token in lexer.scan():
+                        if token.start >= end:
+                            break
+                finally:
+                    self.release_context(lexer)
+                raise TypeError(
+                    f"the chunk at {start} can't be lexed alone, "
+                    "split_at or is_boundary cut inside a token"
+                )
+        index = LineIndex(source)
+        tokens = []
+        for start, part in zip(cuts, parts):
+            base_line, base_col = index.lc(start)
+            for token in part:
+                if "line" in token.__dict__:
+                    # position set by the rule function, it's counted from the chunk
+                    if token.line == 0 and token.col is not None:
+                        token.col += base_col
+                    token.line += base_line
+                if token.start is not None:
+                    token.start, token.end = token.start+start, token.end+start
+                    token.index = index
+                tokens.append(token)
+        if compact is True:
+            tree = CompactTokenTree(source, *tokens, index=index)
+        else:
+            tree = TokenTree(source, *tokens, index=index)
+        if verify is True:
+            expected = self.lex(source, crash_handler=crash_handler)
+            if len(expected.tokens) != len(tree.tokens):
+                raise TypeError(
+                    f"lex_parallel made {len(tree.tokens)} tokens but lex made {len(expected.tokens)}, "
+                    "split_at or is_boundary cut inside a token"
+                )
+            for i, (a, b) in enumerate(zip(tree.tokens, expected.tokens)):
+                if (a.type, a.value, a.start, a.end, a.line, a.col) != (b.type, b.value, b.start, b.end, b.line, b.col):
+                    raise TypeError(
+                        f"lex_parallel token {i} {a!r} at {a.line}:{a.col} is not the same as "
+                        f"{b!r} at {b.line}:{b.col} from lex, split_at or is_boundary cut inside a token"
+                    )
+        return tree
\ No newline at end of file
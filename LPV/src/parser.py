@@ -1,151 +1,536 @@
-# MIT License
-
-# Copyright (c) 2021 xp
-
-# Permission is hereby granted, free of charge, to any person obtaining a copy
-# of this software and associated documentation files (the "Software"), to deal
-# in the Software without restriction, including without limitation the rights
-# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
-# copies of the Software, and to permit persons to whom the Software is
-# furnished to do so, subject to the following conditions:
-
-# The above copyright notice and this permission notice shall be included in all
-# copies or substantial portions of the Software.
-
-# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
-# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
-# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
-# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
-# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
-# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
-# SOFTWARE.
-
-from LPV.src.error import ErrorType, LPV_Exception
-from LPV.src.token import Token, TokenTree, TokenType
-from typing import Callable, Iterable, Union
-import traceback
-
-class LPV_Parser:
-    initiliaze = False
-    def __init__(self):
-        if not "start" in self.__dict__:
-            raise TypeError("no self.start found")
-        if not isinstance(self.start, Iterable):
-            raise TypeError(
-                "self.start must be iterable"
-            )
-        if len(self.start) < 2:
-            raise TypeError(
-                "self.start must have two element: function/function_name and arguments"
-            )
-        self.method, self.args = self.get_method(self.start[0]), self.start[1]
-        self.initiliaze = True
-        
-    def get_method(self, func: Union[str, Callable]) -> Callable:
-        if isinstance(func, str):
-            if func.startswith("parse_"):
-                name = func
-            else:
-                name = "parse_"+func
-            m = getattr(self, name)
-            if not isinstance(m, Callable):
-                raise TypeError(f"{name} must be callable, not {type(m).__name__}")
-            return m
-        if not func.__name__.startswith("parse_"):
-            raise TypeError(f"{func.__name__} name must start with parse_")
-        return func
-    
-    def init(self, token_tree: TokenTree):
-        self.tree, self.source = token_tree, token_tree.source
-        self.token = None
-        self.line, self.col = -1, -1
-        self.next_token()
-    
-    def get_lc(self):
-        return self.line, self.col
-    
-    def throw_error(self, error, msg, pointer_width:int=None, **kwargs):
-        raise LPV_Exception(
-            error=error, msg=msg,
-            line=self.line, col=self.col,
-            source=self.source, 
-            pointer_width=pointer_width if pointer_width is not None
-            else (
-                len(str(self.token.value)) if self.token is not None else 1
-            ),
-            when="Parser", **kwargs
-        )
-    
-    def next_token(self):
-        old_t = self.token
-        self.token = self.tree.next_token()
-        self.line, self.col = self.tree.line, self.tree.col
-        return old_t
-    
-    def is_eof(self):
-        return self.token is None
-    
-    def eat(self, type_: Union[TokenType, Iterable]=None):
-        if type_ is None or self.check_type(type_):
-            return self.next_token()
-        msg = "Unexpected "+("EOF" if self.is_eof() else f"'{self.token.value}'")
-        self.throw_error(
-            ErrorType.SYNTAX, msg+", expected "+(
-                type_.name if isinstance(type_, TokenType) else 
-                ", ".join((str(x) for x in type_[:-1]))+" or "+str(type_[-1])
-            ),
-        )
-    
-    def peek(self, step:int=1):
-        return self.tree.peek(step)
-        
-    def check_type(self, type_: Union[TokenType, Iterable[TokenType]], token=False):
-        if not isinstance(type_, (TokenType, Iterable)):
-            raise TypeError("type_ must be TokenType or Iterable")
-        if isinstance(type_, TokenType):
-            if token is not False:
-                return token == type_
-            return self.token == type_
-        if token is not False:
-            for t in type_:
-                if self.check_type(t, token=token):
-                    return True
-            return False
-        for t in type_:
-            if self.check_type(t):
-                return True
-        return False
-    
-    def eats(self, *types) -> list[Token]:
-        tkns = []
-        for t in types:
-            tkns.append(self.eat(t))
-        return tkns
-    
-    def match(self, *types):
-        for i, t in enumerate(types):
-            if not self.check_type(t, self.peek(i)):
-                return False
-        return True
-    
-    def parse(self, tree: TokenTree, crash_handler:Callable=print):
-        if self.initiliaze is False:
-            raise TypeError(
-                f"{type(self).__name__} is not fully initiliaze. Forgot super().__init__() in the __init__?"
-            )
-        self.init(tree)
-        try:
-            r = self.method(*self.args)
-        except LPV_Exception as e:
-            raise e
-        except Exception as e:
-            if crash_handler is print:
-                crash_handler(traceback.format_exc())
-            else:
-                crash_handler(e)
-            self.throw_error(
-                ErrorType.CRASH,
-                "Uh oh. Looks like the parser got an Python Error."
-            )
-        else:
+# MIT License
+
+# Copyright (c) 2021 xp
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from LPV.src.error import ErrorType, LPV_Exception
+from LPV.src.token import Token, TokenTree, TokenType, TokenSet
+from LPV.src.grammar import Grammar
+from LPV.src.ast import Node, iter_fields, explicit_line
+from LPV.src.arena import ArenaNode
+from LPV.src.context import Reentrant, reentrant, rebind
+from typing import Callable, Iterable, Union
+import traceback, functools
+
+def memoize(method: Callable) -> Callable:
+    """
+    Decorator for parse_* methods, the result (or the LPV_Exception raised) and where it stopped
+    are kept for the token position and arguments it was called with, so backtracking to call it
+    again at the same place doesn't parse again. Arguments must be hashable.
+    """
+    @functools.wraps(method)
+    def memoized(self, *args):
+        pos = self.tree.pos
+        table = self.memo.get(pos)
+        key = (method, args)
+        if table is not None and key in table:
+            entry = table[key]
+            result, end = entry[0], entry[1]
+            if len(entry) == 3:
+                result = self.reuse(pos, key, result, end, entry[2])
+            self.reset(end)
+        else:
+            try:
+                result = method(self, *args)
+            except LPV_Exception as e:
+                result = e
+            end = self.tree.pos
+            self.store(pos, key, result, end)
+        if isinstance(result, LPV_Exception):
+            raise result
+        return result
+    return memoized
+
+def memoize_left_rec(method: Callable) -> Callable:
+    """
+    Like `memoize`, for a left recursive parse_* method (`expr: expr '+' term | term`).
+    The first call fail where it call itself at the same position, then the method is
+    called again with the last result as long as it parse further (seed growing).
+    """
+    @functools.wraps(method)
+    def memoized(self, *args):
+        pos = self.tree.pos
+        table = self.memo.get(pos)
+        key = (method, args)
+        if table is not None and key in table:
+            entry = table[key]
+            result, end = entry[0], entry[1]
+            if len(entry) == 3:
+                result = self.reuse(pos, key, result, end, entry[2])
+            self.reset(end)
+        else:
+            try:
+                self.throw_error(ErrorType.SYNTAX, f"Left recursion in {method.__name__} can't start here")
+            except LPV_Exception as e:
+                result, end = e, pos
+            self.store(pos, key, result, end)
+            first = True
+            while True:
+                self.reset(pos)
+                try:
+                    r = method(self, *args)
+                except LPV_Exception as e:
+                    r = e
+                if first is True and isinstance(r, LPV_Exception):
+                    # nothing to grow, fail with the real error
+                    result, end = r, self.tree.pos
+                    break
+                first = False
+                if isinstance(r, LPV_Exception) or self.tree.pos <= end:
+                    break
+                result, end = r, self.tree.pos
+                self.store(pos, key, result, end)
+            self.reset(end)
+            self.store(pos, key, result, end)
+        if isinstance(result, LPV_Exception):
+            raise result
+        return result
+    return memoized
+
+class Operator:
+    """
+    One entry of a parser operator table (`self.operators`), used by `parse_expression`.
+    Args:
+        type_: TokenType, TokenSet or tuple of TokenType of the operator token
+        power: binding power, operators with a bigger power bind first
+        kind: "infix", "prefix" or "postfix"
+        assoc: "left" or "right", for infix operators
+        node: make the node, node(left, op, right) for infix, node(op, operand) for prefix
+              and node(operand, op) for postfix. By default a tuple of the same arguments
+    """
+    __slots__ = ("types", "power", "kind", "assoc", "node")
+    
+    def __init__(self, type_: Union[TokenType, Iterable[TokenType]], power:int, kind:str="infix",
+                 assoc:str="left", node:Callable=None):
+        if kind not in ("infix", "prefix", "postfix"):
+            raise TypeError(f"Operator kind must be 'infix', 'prefix' or 'postfix' not {kind!r}")
+        if assoc not in ("left", "right"):
+            raise TypeError(f"Operator assoc must be 'left' or 'right' not {assoc!r}")
+        self.types = (type_,) if isinstance(type_, TokenType) else tuple(type_)
+        self.power, self.kind, self.assoc = power, kind, assoc
+        self.node = node if node is not None else (lambda *args: args)
+    
+    def __repr__(self):
+        return f"Operator({', '.join(t.name for t in self.types)}, {self.power}, {self.kind!r}, {self.assoc!r})"
+
+class LPV_Parser(Reentrant):
+    initiliaze = False
+    # maximum number of token positions kept in the memo table of @memoize, None for no limit
+    memo_size = None
+    # how many tokens after the current one parse_* methods may look at (peek), for `reparse`
+    lookahead = 1
+    def __init__(self):
+        if not "start" in self.__dict__:
+            raise TypeError("no self.start found")
+        if not isinstance(self.start, Iterable):
+            raise TypeError(
+                "self.start must be iterable"
+            )
+        if len(self.start) < 2:
+            raise TypeError(
+                "self.start must have two element: function/function_name and arguments"
+            )
+        self.method, self.args = self.get_method(self.start[0]), self.start[1]
+        if "operators" in self.__dict__:
+            self.compile_operators()
+        if "grammar" in self.__dict__:
+            self.compile_grammar()
+        self.initiliaze = True
+    
+    def compile_operators(self):
+        """Make the lookup tables of `parse_expression` from `self.operators` and `self.atom`."""
+        if not "atom" in self.__dict__:
+            raise TypeError("self.atom must be set with self.operators, the method parsing operands")
+        self.atom_method = self.get_method(self.atom)
+        self.prefix_ops, self.infix_ops = {}, {}
+        for op in self.operators:
+            if not isinstance(op, Operator):
+                raise TypeError(f"self.operators must only have Operator not {type(op).__name__}")
+            table = self.prefix_ops if op.kind == "prefix" else self.infix_ops
+            for t in op.types:
+                if t in table:
+                    raise TypeError(f"{t.name} is already a {op.kind if op.kind == 'prefix' else 'infix or postfix'} operator")
+                table[t] = op
+        
+    def make_context(self):
+        context = Reentrant.make_context(self)
+        if "grammar_steps" in self.__dict__:
+            context.grammar_steps = [
+                (symbols, inline, rebind(build, self, context)) for symbols, inline, build in self.grammar_steps
+            ]
+        return context
+    
+    def get_method(self, func: Union[str, Callable]) -> Callable:
+        if isinstance(func, str):
+            if func.startswith("parse_"):
+                name = func
+            else:
+                name = "parse_"+func
+            m = getattr(self, name)
+            if not isinstance(m, Callable):
+                raise TypeError(f"{name} must be callable, not {type(m).__name__}")
+            return m
+        if not func.__name__.startswith("parse_"):
+            raise TypeError(f"{func.__name__} name must start with parse_")
+        return func
+    
+    def init(self, token_tree: TokenTree):
+        if token_tree.pos != -1:
+            # a tree parsed before (given again by a ParseCache for example), start from its first token
+            token_tree.seek(-1)
+        token_tree.memo = None
+        self.tree, self.source = token_tree, token_tree.source
+        self.index = token_tree.index
+        self.token = None
+        self.memo = {}
+        self.next_token()
+    
+    def mark(self) -> int:
+        """Position of the current token, to come back to it with `reset`."""
+        return self.tree.pos
+    
+    def reset(self, mark:int):
+        self.tree.seek(mark)
+        self.token = self.tree.token
+    
+    def store(self, pos:int, key: tuple, result, end:int):
+        table = self.memo.get(pos)
+        if table is None:
+            table = self.memo[pos] = {}
+            if self.memo_size is not None and len(self.memo) > self.memo_size:
+                # forget the positions behind the current one first, down to half the size
+                current = self.tree.pos
+                for p in [p for p in self.memo if p < min(pos, current)]:
+                    del self.memo[p]
+                    if len(self.memo) <= self.memo_size//2:
+                        break
+        table[key] = (result, end)
+        if isinstance(result, Node) and result.token_span is None:
+            result.token_span = (pos, end)
+    
+    def cut(self):
+        """
+        Commit to what was parsed: nothing before the current token will be parsed again,
+        so its memo entries are dropped.
+        """
+        pos = self.tree.pos
+        for p in [p for p in self.memo if p < pos]:
+            del self.memo[p]
+    
+    @property
+    def line(self):
+        return self.tree.line
+    
+    @property
+    def col(self):
+        return self.tree.col
+    
+    def get_lc(self):
+        return self.tree.lc()
+    
+    def get_offset(self):
+        """Offset of the current token, `Node(offset=..., index=self.index)` resolve line and col from it when needed."""
+        return self.tree.offset
+    
+    def throw_error(self, error, msg, pointer_width:int=None, **kwargs):
+        raise LPV_Exception(
+            error=error, msg=msg,
+            line=self.tree.line, col=self.tree.col,
+            source=self.source, index=self.index,
+            pointer_width=pointer_width if pointer_width is not None
+            else (
+                len(str(self.token.value)) if self.token is not None else 1
+            ),
+            when="Parser", **kwargs
+        )
+    
+    def next_token(self):
+        old_t = self.token
+        self.token = self.tree.next_token()
+        return old_t
+    
+    def is_eof(self):
+        return self.token is None
+    
+    def eat(self, type_: Union[TokenType, Iterable]=None):
+        if type_ is None or self.check_type(type_):
+            return self.next_token()
+        msg = "Unexpected "+("EOF" if self.is_eof() else f"'{self.token.value}'")
+        if not isinstance(type_, TokenType):
+            type_ = tuple(type_)
+        self.throw_error(
+            ErrorType.SYNTAX, msg+", expected "+(
+                type_.name if isinstance(type_, TokenType) else 
+                ", ".join((str(x) for x in type_[:-1]))+" or "+str(type_[-1])
+            ),
+        )
+    
+    def peek(self, step:int=1):
+        return self.tree.peek(step)
+        
+    def check_type(self, type_: Union[TokenType, Iterable[TokenType]], token=False):
+        if token is False:
+            token = self.token
+        if isinstance(token, Token):
+            # TokenType are interned, so the identity checks below are enough for them
+            kind = token.type
+            if isinstance(type_, TokenType):
+                return kind is type_
+            if isinstance(type_, TokenSet):
+                return kind in type_
+            if isinstance(type_, (tuple, list)):
+                for t in type_:
+                    if t is kind:
+                        return True
+                for t in type_:
+                    if not isinstance(t, TokenType) and self.check_type(t, token=token):
+                        return True
+                return False
+        if not isinstance(type_, (TokenType, Iterable)):
+            raise TypeError("type_ must be TokenType or Iterable")
+        if isinstance(type_, TokenType):
+            return token == type_
+        for t in type_:
+            if self.check_type(t, token=token):
+                return True
+        return False
+    
+    def parse_expression(self, power:int=0):
+        """
+        Parse an expression with the operator table, only operators with a binding power
+        of at least `power` are used. Operands are parsed with `self.atom`.
+        """
+        token = self.token
+        op = self.prefix_ops.get(token.type) if token is not None else None
+        if op is not None:
+            self.next_token()
+            left = op.node(token, self.parse_expression(op.power))
+        else:
+            left = self.atom_method()
+        infix_ops = self.infix_ops
+        while True:
+            token = self.token
+            if token is None:
+                return left
+            op = infix_ops.get(token.type)
+            if op is None or op.power < power:
+                return left
+            self.next_token()
+            if op.kind == "postfix":
+                left = op.node(left, token)
+            else:
+                left = op.node(left, token, self.parse_expression(
+                    op.power+1 if op.assoc == "left" else op.power
+                ))
+    
+    def parse_grammar(self, rule:str=None):
+        """
+        Parse `rule` (the first rule by default) of `self.grammar` with its LL(1) table, without
+        `rule` the start rule must go up to the end of the tokens.
+        A rule alternative with `-> name` return `self.build_name(*children)`, else `self.build_<rule>`
+        is used if it exists, else the only child or a tuple of the children.
+        `self.rule_token` is the first token of the rule while it's built.
+        """
+        table, steps, tree = self.grammar_table, self.grammar_steps, self.tree
+        stack, values = [self.grammar.start if rule is None else rule], []
+        while stack:
+            symbol = stack.pop()
+            kind = type(symbol)
+            if kind is TokenType:
+                token = self.token
+                if token is None or token.type is not symbol:
+                    self.eat(symbol)
+                values.append(token)
+                self.token = tree.next_token()
+            elif kind is str:
+                token = self.token
+                row = table[symbol]
+                i = row.get(-1 if token is None else token.type.id)
+                if i is None:
+                    expected = sorted("EOF" if t is None else t.name for t in self.grammar.table[symbol])
+                    self.throw_error(
+                        ErrorType.SYNTAX,
+                        "Unexpected "+("EOF" if token is None else f"'{token.value}'")+", expected "+(
+                            expected[0] if len(expected) == 1 else ", ".join(expected[:-1])+" or "+expected[-1]
+                        )
+                    )
+                symbols, inline, build = steps[i]
+                if inline is False:
+                    # the children of inline productions just stay in values for the rule using them
+                    stack.append((build, len(values), token))
+                stack.extend(symbols)
+            else:
+                build, base, self.rule_token = symbol
+                children = values[base:]
+                del values[base:]
+                if build is not None:
+                    values.append(build(*children))
+                else:
+                    values.append(children[0] if len(children) == 1 else tuple(children))
+        if rule is None and self.token is not None:
+            # the start rule is done, the tokens left are not part of it
+            self.throw_error(ErrorType.SYNTAX, f"Unexpected '{self.token.value}', expected EOF")
+        return values[0]
+    
+    def compile_grammar(self):
+        """
+        Rows of the table by TokenType id (-1 for EOF), and for every production of `self.grammar`:
+        its symbols reversed for the stack, if it's inline and its build method.
+        """
+        if isinstance(self.grammar, str):
+            self.grammar = Grammar(self.grammar, getattr(self, "grammar_cache", None))
+        self.grammar_table = {
+            name: {-1 if t is None else t.id: i for t, i in row.items()}
+            for name, row in self.grammar.table.items()
+        }
+        self.grammar_steps = []
+        for p in self.grammar.productions:
+            build = getattr(self, "build_"+(p.action or p.name), None)
+            if build is None and p.action is not None:
+                raise TypeError(f"no build_{p.action} found for '-> {p.action}'")
+            self.grammar_steps.append((tuple(reversed(p.symbols)), p.inline, build))
+    
+    def eats(self, *types) -> list[Token]:
+        tkns = []
+        for t in types:
+            tkns.append(self.eat(t))
+        return tkns
+    
+    def match(self, *types):
+        for i, t in enumerate(types):
+            if not self.check_type(t, self.peek(i)):
+                return False
+        return True
+    
+    def carry(self, memo: dict, tree: TokenTree) -> dict:
+        """
+        The entries of `memo` (from the parse of the tree `tree` was relexed from) that are not
+        touching the edit, at their new token positions. Entries after the edit are marked to be shifted.
+        """
+        start, end, new_end = tree.edit
+        d_tokens = new_end-end
+        carried = {}
+        for pos, table in memo.items():
+            if start <= pos < end or (pos >= end and tree.shift is None):
+                # nothing after the edit is the same when the lexer didn't find the old tokens again
+                continue
+            kept = {}
+            for key, (result, stop) in table.items():
+                if isinstance(result, LPV_Exception):
+                    # the error has its position in it, parse it again
+                    continue
+                if pos >= end:
+                    kept[key] = (result, stop+d_tokens, True)
+                elif stop+self.lookahead < start:
+                    kept[key] = (result, stop, False)
+            if kept:
+                carried[pos+d_tokens if pos >= end else pos] = kept
+        return carried
+    
+    def reuse(self, pos:int, key: tuple, result, end:int, shift:bool):
+        """A result carried by `reparse` is used: shift the nodes in it if it's after the edit and count them."""
+        delta, line, d_line, d_col = self.tree.shift if shift is True else (0, None, 0, 0)
+        d_tokens = self.tree.edit[2]-self.tree.edit[1]
+        seen, index = self.reused_ids, self.index
+        stack, count = [result], 0
+        push = stack.append
+        while stack:
+            o = stack.pop()
+            if type(o) is list or type(o) is tuple:
+                stack.extend(o)
+                continue
+            if not isinstance(o, Node) or isinstance(o, ArenaNode) or id(o) in seen:
+                # the nodes of a NodeArena are read only, they keep their position
+                continue
+            seen.add(id(o))
+            count += 1
+            if shift is True:
+                if o.offset is not None:
+                    o.offset, o.index = o.offset+delta, index
+                # the line slot is only set when the position is given explicitly
+                if explicit_line(o) is not None:
+                    if o.line == line:
+                        o.col += d_col
+                    o.line += d_line
+                if o.token_span is not None:
+                    o.token_span = (o.token_span[0]+d_tokens, o.token_span[1]+d_tokens)
+            for _, v in iter_fields(o):
+                if type(v) is list or type(v) is tuple or isinstance(v, Node):
+                    push(v)
+        self.reused += count
+        self.memo[pos][key] = (result, end)
+        return result
+    
+    @reentrant
+    def reparse(self, old_tree: TokenTree, tree: TokenTree, crash_handler:Callable=print):
+        """
+        Parse `tree`, made by `lexer.relex(old_tree, ...)` after `old_tree` was parsed with this parser.
+        What the @memoize parse_* methods returned for the tokens before and after the edit is used
+        again (the nodes after it are shifted to their new position) and only the rules that touch
+        the edit are parsed again. `tree.reused_nodes` is the number of nodes reused (set on the tree,
+        the parser may have run on a copy of itself).
+        """
+        if self.initiliaze is False:
+            raise TypeError(
+                f"{type(self).__name__} is not fully initiliaze. Forgot super().__init__() in the __init__?"
+            )
+        self.init(tree)
+        self.reused, self.reused_ids = 0, set()
+        if getattr(old_tree, "memo", None) is not None and getattr(tree, "edit", None) is not None:
+            self.memo = self.carry(old_tree.memo, tree)
+        try:
+            return self.run_method(crash_handler)
+        finally:
+            tree.reused_nodes = self.reused
+            # results after the edit that were not used are not shifted, forget them
+            for table in self.memo.values():
+                for key, entry in [(k, e) for k, e in table.items() if len(e) == 3]:
+                    if entry[2] is True:
+                        del table[key]
+                    else:
+                        table[key] = entry[:2]
+    
+    @reentrant
+    def parse(self, tree: TokenTree, crash_handler:Callable=print):
+        if self.initiliaze is False:
+            raise TypeError(
+                f"{type(self).__name__} is not fully initiliaze. Forgot super().__init__() in the __init__?"
+            )
+        self.init(tree)
+        return self.run_method(crash_handler)
+    
+    def run_method(self, crash_handler:Callable=print):
+        """Run the start rule on the tree given to `init`, the memo is kept on the tree for `reparse`."""
+        self.tree.memo = self.memo
+        try:
+            r = self.method(*self.args)
+        except LPV_Exception as e:
+            raise e
+        except Exception as e:
+            if crash_handler is print:
+                crash_handler(traceback.format_exc())
+            else:
+                crash_handler(e)
+            self.throw_error(
+                ErrorType.CRASH,
+                "Uh oh. Looks like the parser got an Python Error."
+            )
+        else:
             return r
\ No newline at end of file
@@ -0,0 +1,92 @@
+# MIT License
+
+# Copyright (c) 2021 xp
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+from array import array
+from bisect import bisect_right
+
+class LineIndex:
+    """
+    Offsets of every newline in a source, used to turn an offset into (line, col).
+    The table is built the first time a position is resolved. Like the lexer
+    always counted, a newline character is at col -1 of the line it starts.
+    """
+    
+    def __init__(self, source=None):
+        self.source = source
+        self.newlines = None if source is not None else array("q")
+        self.dropped, self.last_dropped = 0, -1
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.source is not None:
+            # cheaper to find the newlines again than to pickle them
+            state["newlines"] = None
+        return state
+    
+    def build(self):
+        newline = "\n" if isinstance(self.source, str) else b"\n"
+        newlines = array("q")
+        find = self.source.find
+        pos = find(newline)
+        while pos != -1:
+            newlines.append(pos)
+            pos = find(newline, pos+1)
+        self.newlines = newlines
+    
+    def add(self, text, offset:int):
+        """Record the newlines of `text`, that start at `offset` in the source (streaming)."""
+        if self.newlines is None:
+            self.build()
+        newline = "\n" if isinstance(text, str) else b"\n"
+        pos = text.find(newline)
+        while pos != -1:
+            self.newlines.append(offset+pos)
+            pos = text.find(newline, pos+1)
+    
+    def drop(self, offset:int):
+        """Forget the newlines before `offset`, positions before it can't be resolved anymore."""
+        if self.newlines is None:
+            self.build()
+        k = bisect_right(self.newlines, offset-1)
+        if k:
+            self.last_dropped = self.newlines[k-1]
+            self.dropped += k
+            del self.newlines[:k]
+    
+    def lc(self, offset:int) -> tuple:
+        if self.newlines is None:
+            self.build()
+        k = bisect_right(self.newlines, offset)
+        last = self.newlines[k-1] if k else self.last_dropped
+        return self.dropped+k, offset-last-1
+    
+    def line_text(self, line:int, encoding:str="utf-8"):
+        if self.source is None:
+            return None
+        if self.newlines is None:
+            self.build()
+        k = line-self.dropped
+        start = self.newlines[k-1]+1 if k > 0 else 0
+        end = self.newlines[k] if k < len(self.newlines) else len(self.source)
+        text = self.source[start:end]
+        if not isinstance(text, str):
+            text = bytes(text).decode(encoding, "replace")
+        return text.rstrip("\r")
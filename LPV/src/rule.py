@@ -0,0 +1,565 @@
+# MIT License
+
+# Copyright (c) 2021 xp
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+from typing import Callable
+from LPV.src.context import rebind
+import inspect, re, sys, types, weakref
+
+def max_width(widths):
+    widths = tuple(widths)
+    if None in widths:
+        return None
+    return max(widths, default=0)
+
+class StringMatcher:
+    
+    def __init__(self, string: str, incase_sensitive:bool=False):
+        self.string, self.incase_sensitive = string, incase_sensitive
+        self.lower = string.lower()
+        self.width = len(string)
+    
+    def match(self, source, pos:int):
+        if self.incase_sensitive is False:
+            if source.startswith(self.string, pos):
+                return self.width
+            return None
+        if source[pos:pos+self.width].lower() == self.lower:
+            return self.width
+        return None
+    
+    def can_start(self, char) -> bool:
+        if not self.string:
+            return True
+        if self.incase_sensitive is False:
+            return self.string[:1] == char
+        return not char.isascii() or self.lower.startswith(char.lower())
+    
+    def start_chars(self) -> set:
+        if not self.string:
+            return set()
+        first = self.string[:1]
+        if self.incase_sensitive is False:
+            return {first}
+        return {first, first.lower(), first.upper()}
+
+class BytesMatcher(StringMatcher):
+    
+    def match(self, source, pos:int):
+        if self.incase_sensitive is False:
+            if source[pos:pos+self.width] == self.string:
+                return self.width
+            return None
+        if source[pos:pos+self.width].lower() == self.lower:
+            return self.width
+        return None
+
+class OptionalMatcher:
+    
+    def __init__(self, matchers: tuple):
+        self.matchers = matchers
+        self.width = max_width(m.width for m in matchers)
+    
+    def match(self, source, pos:int):
+        for m in self.matchers:
+            count = m.match(source, pos)
+            if count is not None:
+                return count
+        return None
+    
+    def can_start(self, char) -> bool:
+        for m in self.matchers:
+            if m.can_start(char):
+                return True
+        return False
+    
+    def start_chars(self) -> set:
+        chars = set()
+        for m in self.matchers:
+            chars |= m.start_chars()
+        return chars
+
+class TrieMatcher:
+    """
+    Match a list (or a case-insensitive set) of strings in one pass over the source,
+    the longest string win. Nodes are dicts of char to node, the `None` key mark
+    the end of a string.
+    """
+    
+    def __init__(self, strings, incase_sensitive:bool=False):
+        self.incase_sensitive = incase_sensitive
+        self.root = {}
+        self.width = 0
+        for string in strings:
+            node = self.root
+            for char in string:
+                node = node.setdefault(self.fold(char), {})
+            node[None] = True
+            self.width = max(self.width, len(string))
+    
+    def fold(self, char):
+        if self.incase_sensitive is False:
+            return char
+        if isinstance(char, int):
+            return char+32 if 65 <= char <= 90 else char
+        return char.lower()
+    
+    def match(self, source, pos:int):
+        node, best, i, end = self.root, None, pos, len(source)
+        if self.incase_sensitive is False:
+            while True:
+                if None in node:
+                    best = i
+                if i >= end:
+                    break
+                node = node.get(source[i])
+                if node is None:
+                    break
+                i += 1
+        else:
+            fold = self.fold
+            while True:
+                if None in node:
+                    best = i
+                if i >= end:
+                    break
+                node = node.get(fold(source[i]))
+                if node is None:
+                    break
+                i += 1
+        return None if best is None else best-pos
+    
+    def can_start(self, char) -> bool:
+        if None in self.root:
+            return True
+        if not char:
+            return False
+        return self.fold(char[0]) in self.root
+    
+    def start_chars(self) -> set:
+        chars = set()
+        for key in self.root:
+            if key is None:
+                continue
+            if isinstance(key, int):
+                chars.add(bytes((key,)))
+                if self.incase_sensitive is True and 97 <= key <= 122:
+                    chars.add(bytes((key-32,)))
+            else:
+                chars.add(key)
+                if self.incase_sensitive is True:
+                    chars.add(key.upper())
+        return chars
+
+class ForwardMatcher:
+    
+    def __init__(self, matchers: tuple):
+        self.matchers = matchers
+        self.width = max_width(
+            None if m.width is None else i+m.width for i, m in enumerate(matchers)
+        )
+    
+    def match(self, source, pos:int):
+        total = 0
+        for i, m in enumerate(self.matchers):
+            count = m.match(source, pos+i)
+            if count is None:
+                return None
+            total += count
+        return total
+    
+    def can_start(self, char) -> bool:
+        if not self.matchers:
+            return True
+        return self.matchers[0].can_start(char)
+    
+    def start_chars(self) -> set:
+        if not self.matchers:
+            return set()
+        return self.matchers[0].start_chars()
+
+class PredicateMatcher:
+    
+    def __init__(self, func: Callable):
+        self.func = func
+        self.width = 1
+    
+    def match(self, source, pos:int):
+        char = source[pos:pos+1]
+        if not char:
+            return None
+        return 1 if self.func(char) else None
+    
+    def can_start(self, char) -> bool:
+        return True
+    
+    def start_chars(self) -> set:
+        return set()
+
+class RegexMatcher:
+    
+    def __init__(self, pattern: re.Pattern):
+        self.pattern = pattern
+        self.width = None
+    
+    def match(self, source, pos:int):
+        m = self.pattern.match(source, pos)
+        if m is None or m.end() == pos:
+            return None
+        return m.end()-pos
+    
+    def can_start(self, char) -> bool:
+        return True
+    
+    def start_chars(self) -> set:
+        return set()
+
+def predicate_ranges(func: Callable, last:int) -> list:
+    ranges, start = [], None
+    for code in range(last+1):
+        if func(chr(code)):
+            if start is None:
+                start = code
+        elif start is not None:
+            ranges.append((start, code-1))
+            start = None
+    if start is not None:
+        ranges.append((start, last))
+    return ranges
+
+def merge_ranges(ranges) -> list:
+    merged = []
+    for lo, hi in sorted(ranges):
+        if merged and lo <= merged[-1][1]+1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], hi))
+        else:
+            merged.append((lo, hi))
+    return merged
+
+class CharClass:
+    r"""
+    A set of characters that the lexer scan a whole run of at once
+    (`enter_while`, `skip_while` and rules), with one regex call.
+    Made from any number of:
+        str: every character in it
+        tuple: a range of characters, like ("a", "z")
+        re.Pattern: a regex matching one character, like re.compile(r"\s")
+        Callable: a predicate like str.isdigit, checked against every code point
+                  the first time the class is used (only ASCII in bytes mode)
+    In bytes mode the characters are single bytes, from \x00 to \xff.
+    A CharClass is also a Callable, so it work anywhere a predicate does.
+    """
+    # code point ranges of the predicates by their max code point, forgotten with the predicate
+    predicates = weakref.WeakKeyDictionary()
+    # str.isdigit and the like can't be weak keys, they stay as long as Python anyway
+    builtin_predicates = {}
+    # predicates that a regex class already match exactly, no need to check every code point
+    categories = {str.isspace: "\\s", str.isdecimal: "\\d"}
+    
+    def __init__(self, *specs, negate:bool=False):
+        for spec in specs:
+            if isinstance(spec, tuple):
+                if len(spec) != 2 or not all(isinstance(c, str) and len(c) == 1 for c in spec):
+                    raise TypeError(f"CharClass range must be a tuple of 2 characters: {spec}")
+            elif not isinstance(spec, (str, re.Pattern, Callable)):
+                raise TypeError(f"CharClass only accept str, tuple, re.Pattern or Callable: {spec}")
+        self.specs, self.negate = specs, negate
+        self.patterns = {}
+    
+    def ranges(self, bytes_mode:bool=False) -> list:
+        last = 0xff if bytes_mode is True else sys.maxunicode
+        ranges = []
+        for spec in self.specs:
+            if isinstance(spec, str):
+                ranges.extend((ord(c), ord(c)) for c in spec)
+            elif isinstance(spec, tuple):
+                ranges.append((ord(spec[0]), ord(spec[1])))
+            elif not isinstance(spec, re.Pattern) and spec not in self.categories:
+                ranges.extend(self.ranges_of(spec, 0x7f if bytes_mode is True else last))
+        return [(lo, min(hi, last)) for lo, hi in merge_ranges(ranges) if lo <= last]
+    
+    def ranges_of(self, predicate: Callable, last:int) -> list:
+        try:
+            table = CharClass.predicates.setdefault(predicate, {})
+        except TypeError:
+            if isinstance(predicate, (types.BuiltinFunctionType, types.MethodDescriptorType)):
+                table = CharClass.builtin_predicates.setdefault(predicate, {})
+            else:
+                # not kept, `patterns` still keep the regex of this class
+                table = {}
+        ranges = table.get(last)
+        if ranges is None:
+            ranges = table[last] = predicate_ranges(predicate, last)
+        return ranges
+    
+    def regex(self, bytes_mode:bool=False) -> str:
+        """Pattern string matching one character, bytes mode patterns are decoded as latin-1."""
+        parts = []
+        ranges = self.ranges(bytes_mode)
+        categories = "".join(self.categories[s] for s in self.specs if s in self.categories)
+        if ranges or categories:
+            parts.append("["+categories+"".join(
+                re.escape(chr(lo)) if lo == hi else re.escape(chr(lo))+"-"+re.escape(chr(hi))
+                for lo, hi in ranges
+            )+"]")
+        for spec in self.specs:
+            if isinstance(spec, re.Pattern):
+                r = to_regex(spec, encoding="latin-1" if bytes_mode is True else None)
+                if r is None:
+                    raise TypeError(f"CharClass can't use this regex: {spec}")
+                parts.append(r)
+        if self.negate is False:
+            if not parts:
+                return "(?!)"
+            return parts[0] if len(parts) == 1 else "(?:"+"|".join(parts)+")"
+        if not parts:
+            return "[\\s\\S]"
+        if len(parts) == 1 and (ranges or categories):
+            return "[^"+parts[0][1:]
+        return "(?:(?!"+"|".join(parts)+")[\\s\\S])"
+    
+    def compile(self, bytes_mode:bool=False) -> re.Pattern:
+        """The pattern matching a run of one or more characters of the class."""
+        pattern = self.patterns.get(bytes_mode)
+        if pattern is None:
+            pattern = "(?:"+self.regex(bytes_mode)+")+"
+            pattern = re.compile(pattern.encode("latin-1") if bytes_mode is True else pattern)
+            self.patterns[bytes_mode] = pattern
+        return pattern
+    
+    def run(self, source, pos:int) -> int:
+        """Length of the run of characters of the class at `pos`."""
+        m = self.compile(not isinstance(source, str)).match(source, pos)
+        return 0 if m is None else m.end()-pos
+    
+    def __call__(self, char) -> bool:
+        return len(char) == 1 and self.run(char, 0) == 1
+    
+    def __repr__(self):
+        specs = ", ".join(
+            getattr(s, "__qualname__", None) or repr(s) if callable(s) and not isinstance(s, re.Pattern)
+            else repr(s) for s in self.specs
+        )
+        return f"CharClass({specs}{', negate=True' if self.negate else ''})"
+
+class CharClassMatcher:
+    
+    def __init__(self, charclass: CharClass, bytes_mode:bool=False):
+        self.charclass = charclass
+        self.pattern = charclass.compile(bytes_mode)
+        self.width = None
+    
+    def match(self, source, pos:int):
+        m = self.pattern.match(source, pos)
+        return None if m is None else m.end()-pos
+    
+    def can_start(self, char) -> bool:
+        return self.charclass(char)
+    
+    def start_chars(self) -> set:
+        return set()
+
+def to_bytes(obj, encoding: str):
+    """Encode a str rule or a str re.Pattern for a bytes mode lexer."""
+    if isinstance(obj, str):
+        return obj.encode(encoding)
+    if isinstance(obj, re.Pattern) and isinstance(obj.pattern, str):
+        return re.compile(obj.pattern.encode(encoding), obj.flags & ~re.UNICODE)
+    return obj
+
+def compile_matcher(obj, incase_sensitive:bool=False, encoding:str=None):
+    if encoding is not None:
+        obj = to_bytes(obj, encoding)
+    if isinstance(obj, str):
+        return StringMatcher(obj, incase_sensitive)
+    elif isinstance(obj, bytes):
+        return BytesMatcher(obj, incase_sensitive)
+    elif isinstance(obj, re.Pattern):
+        return RegexMatcher(obj)
+    elif isinstance(obj, CharClass):
+        return CharClassMatcher(obj, encoding is not None)
+    elif isinstance(obj, tuple):
+        # each element of a tuple match only one character
+        return ForwardMatcher(tuple(
+            PredicateMatcher(o) if isinstance(o, CharClass) else compile_matcher(o, encoding=encoding)
+            for o in obj
+        ))
+    elif isinstance(obj, (list, set)):
+        insensitive = incase_sensitive or isinstance(obj, set)
+        if encoding is not None:
+            obj = [to_bytes(o, encoding) for o in obj]
+        if obj and all(isinstance(o, (str, bytes)) for o in obj):
+            return TrieMatcher(obj, insensitive)
+        return OptionalMatcher(tuple(compile_matcher(o, insensitive, encoding) for o in obj))
+    elif isinstance(obj, Callable):
+        return PredicateMatcher(obj)
+    raise TypeError(f"Only accept type tuple, list, str, re.Pattern, CharClass or Callable: {obj}")
+
+FUSABLE_FLAGS = {re.IGNORECASE: "i", re.MULTILINE: "m", re.DOTALL: "s"}
+
+def to_regex(obj, incase_sensitive:bool=False, encoding:str=None):
+    """
+    Return the pattern string that match exactly like `obj` would,
+    or None if `obj` can't be expressed as a regex (tuple and Callable).
+    Bytes patterns are returned decoded as latin-1, so they can be joined
+    like str and encoded back without changing any byte.
+    """
+    if isinstance(obj, CharClass):
+        return "(?:"+obj.regex(encoding is not None)+")+"
+    if encoding is not None:
+        obj = to_bytes(obj, encoding)
+    if isinstance(obj, bytes):
+        if incase_sensitive is False:
+            return re.escape(obj).decode("latin-1")
+        return "(?i:"+re.escape(obj).decode("latin-1")+")"
+    elif isinstance(obj, str):
+        if incase_sensitive is False:
+            return re.escape(obj)
+        if not obj.isascii():
+            return None
+        return "(?i:"+re.escape(obj)+")"
+    elif isinstance(obj, re.Pattern):
+        pattern = obj.pattern
+        if isinstance(pattern, bytes):
+            pattern = pattern.decode("latin-1")
+        if re.search(r"\\[1-9]", pattern):
+            return None
+        flags = obj.flags & ~re.UNICODE
+        inline = ""
+        for flag, letter in FUSABLE_FLAGS.items():
+            if flags & flag:
+                inline += letter
+                flags &= ~flag
+        if flags:
+            return None
+        return f"(?{inline}:{pattern})" if inline else f"(?:{pattern})"
+    elif isinstance(obj, (list, set)):
+        insensitive = incase_sensitive or isinstance(obj, set)
+        if all(isinstance(o, (str, bytes)) for o in obj):
+            # longest first, like the trie
+            obj = sorted(obj, key=len, reverse=True)
+        alternatives = []
+        for o in obj:
+            r = to_regex(o, insensitive, encoding)
+            if r is None:
+                return None
+            alternatives.append(r)
+        if not alternatives:
+            return None
+        return "(?:"+"|".join(alternatives)+")"
+    return None
+
+class Rule:
+    __slots__ = ("pattern", "func", "matcher", "arity", "consume")
+    grouped = False
+    
+    def __init__(self, pattern, func: Callable, encoding:str=None):
+        self.pattern, self.func = pattern, func
+        self.matcher = compile_matcher(pattern, encoding=encoding)
+        self.arity = len(inspect.signature(func).parameters)
+        self.consume = isinstance(pattern, re.Pattern)
+    
+    def bind(self, old, new) -> "Rule":
+        """The same rule with its function calling `new` instead of `old` (see `rebind`)."""
+        rule = Rule.__new__(Rule)
+        rule.pattern, rule.matcher, rule.arity, rule.consume = self.pattern, self.matcher, self.arity, self.consume
+        rule.func = rebind(self.func, old, new)
+        return rule
+    
+    def __repr__(self):
+        return f"Rule({self.pattern!r}, {getattr(self.func, '__name__', self.func)})"
+
+
+class FusedMatcher:
+    
+    def __init__(self, rules: tuple, pattern: re.Pattern):
+        self.rules, self.pattern = rules, pattern
+        self.groups = {f"LPV_{i}": rule for i, rule in enumerate(rules)}
+        self.width = None
+    
+    def match(self, source, pos:int):
+        m = self.pattern.match(source, pos)
+        if m is None:
+            return None
+        if m.end() == pos:
+            # an empty match hides the alternatives after it, retry one by one
+            for rule in self.rules:
+                count = rule.matcher.match(source, pos)
+                if count is not None:
+                    return rule, count
+            return None
+        return self.groups[m.lastgroup], m.end()-pos
+    
+    def can_start(self, char) -> bool:
+        for rule in self.rules:
+            if rule.matcher.can_start(char):
+                return True
+        return False
+    
+    def start_chars(self) -> set:
+        chars = set()
+        for rule in self.rules:
+            chars |= rule.matcher.start_chars()
+        return chars
+
+class RuleGroup:
+    __slots__ = ("rules", "matcher")
+    grouped = True
+    
+    def __init__(self, rules: tuple, pattern: re.Pattern):
+        self.rules = rules
+        self.matcher = FusedMatcher(rules, pattern)
+    
+    def __repr__(self):
+        return f"RuleGroup{self.rules!r}"
+
+def fuse_rules(rules: tuple, encoding:str=None) -> tuple:
+    """
+    Fuse every run of regex expressible rules into one master pattern.
+    `encoding` is given when the lexer is in bytes mode.
+    Rules that can't be expressed (tuple and Callable) stay as it is,
+    so the first match win order is kept.
+    """
+    steps, run = [], []
+    def flush():
+        if len(run) > 1:
+            try:
+                pattern = "|".join(
+                    f"(?P<LPV_{i}>{r})" for i, (r, _) in enumerate(run)
+                )
+                pattern = re.compile(
+                    pattern if encoding is None else pattern.encode("latin-1")
+                )
+            except re.error:
+                steps.extend(rule for _, rule in run)
+            else:
+                steps.append(RuleGroup(tuple(rule for _, rule in run), pattern))
+        else:
+            steps.extend(rule for _, rule in run)
+        run.clear()
+    for rule in rules:
+        r = to_regex(rule.pattern, encoding=encoding)
+        if r is None:
+            flush()
+            steps.append(rule)
+        else:
+            run.append((r, rule))
+    flush()
+    return tuple(steps)
@@ -1,121 +1,426 @@
-# MIT License
-
-# Copyright (c) 2021 xp
-
-# Permission is hereby granted, free of charge, to any person obtaining a copy
-# of this software and associated documentation files (the "Software"), to deal
-# in the Software without restriction, including without limitation the rights
-# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
-# copies of the Software, and to permit persons to whom the Software is
-# furnished to do so, subject to the following conditions:
-
-# The above copyright notice and this permission notice shall be included in all
-# copies or substantial portions of the Software.
-
-# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
-# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
-# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
-# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
-# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
-# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
-# SOFTWARE.
-from typing import Iterable
-
-class TokenType:
-    
-    def __init__(self, name: str) -> None:
-        self.name = name
-    def __repr__(self):
-        return self.name
-    def __eq__(self, o):
-        if isinstance(o, Token):
-            return self.name == o.type
-        return (self.name == o) if not isinstance(o, TokenType) else (self.name == o.name)
-
-class Token:
-    
-    def __init__(self, type_: TokenType, value) -> None:
-        if not isinstance(type_, TokenType):
-            raise TypeError(
-                f"type_ argument must be TokenType not {type(type_).__name__}"
-            )
-        self.type, self.value = type_, value
-        self.line, self.col = None, None
-    def set_lc(self, line:int, col:int):
-        self.line, self.col = line, col
-    def __repr__(self) -> str:
-        return "Token({type}, '{value}')".format(
-            type=self.type,value=self.value
-        )
-    def __eq__(self, o: object) -> bool:
-        if isinstance(o, Token):
-            return (self.type == o.type and self.value == o.value)
-        return (self.type == o) if isinstance(o, TokenType) else (self.value == o)
-    def __ne__(self, o: object) -> bool:
-        return not self.__eq__(o)
-
-def generate_tokens(name: str, tokens: Iterable[str], build:bool=False):
-    if not name.isidentifier():
-        raise TypeError(
-                f"Invalid class name: {name}"
-            )
-    for t in tokens:
-        if not t.isidentifier():
-            raise TypeError(
-                f"Invalid token name: {t}"
-            )
-    code = """\
-class {name}:
-{attributes}\
-""".format(
-            name=name,
-            attributes="\n".join(
-                (f"    {t} = TokenType('{t}')" for t in tokens)
-            )
-        )
-    if build is True:
-        return code
-    exec(code)
-    return eval(name)
-
-class TokenTree:
-    
-    def __init__(self, source: str, *tokens: Token) -> None:
-        self.source = source
-        self.tokens, self.len_t = tokens, len(tokens)
-        self.pos, self.token = -1, None
-        self.line, self.col = 0, 0
-    
-    def __getitem__(self, index):
-        return self.tokens[index]
-    
-    def next_token(self):
-        self.pos += 1
-        if self.pos >= self.len_t:
-            self.token = None
-            return self.token
-        else:
-            self.token = self.tokens[self.pos]
-            self.line, self.col = self.token.line, self.token.col
-            return self.token
-    
-    def peek(self, step:int=1):
-        p = self.pos+step
-        if p >= self.len_t:
-            return None
-        return self.tokens[p]
-    
-    def get(self, o: object, default=None):
-        for t in self.tokens:
-            if t == o:
-                return t
-        return default
-    
-    def __repr__(self):
-        string = "TokenTree:\n"
-        space = " "*len(string[:-1])
-        for token in self.tokens:
-            head = f"{token.type}:"
-            content = f"{' '*len(head)}\"{token.value}\""
-            string += space+head+"\n"+space+content+"\n"
-        return string
\ No newline at end of file
+# MIT License
+
+# Copyright (c) 2021 xp
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+from typing import Iterable, Iterator
+from array import array
+from LPV.src.position import LineIndex
+
+class TokenType:
+    """
+    TokenType are interned: TokenType("PLUS") always return the same object,
+    with a small integer `id` that is used by TokenSet and CompactTokenTree.
+    """
+    registry = {}
+    types = []
+    
+    def __new__(cls, name: str):
+        t = TokenType.registry.get(name)
+        if t is None:
+            t = super().__new__(cls)
+            t.name, t.id = name, len(TokenType.types)
+            TokenType.registry[name] = t
+            TokenType.types.append(t)
+        return t
+    def __reduce__(self):
+        return (TokenType, (self.name,))
+    def __repr__(self):
+        return self.name
+    def __eq__(self, o):
+        if o is self:
+            return True
+        if isinstance(o, Token):
+            return self is o.type or self.name == o.type
+        return (self.name == o) if not isinstance(o, TokenType) else (self.name == o.name)
+    def __hash__(self):
+        return hash(self.name)
+
+class TokenSet:
+    """Set of TokenType backed by a bitmask of their ids."""
+    __slots__ = ("mask",)
+    
+    def __init__(self, *types):
+        mask = 0
+        for t in types:
+            if isinstance(t, TokenSet):
+                mask |= t.mask
+            elif isinstance(t, str):
+                mask |= 1 << TokenType(t).id
+            elif isinstance(t, TokenType):
+                mask |= 1 << t.id
+            else:
+                raise TypeError(f"TokenSet only accept TokenType, str or TokenSet, not {type(t).__name__}")
+        self.mask = mask
+    def __contains__(self, o) -> bool:
+        if isinstance(o, Token):
+            o = o.type
+        elif isinstance(o, str):
+            o = TokenType.registry.get(o)
+        if not isinstance(o, TokenType):
+            return False
+        return (self.mask >> o.id) & 1 == 1
+    def __iter__(self):
+        mask, i = self.mask, 0
+        while mask:
+            if mask & 1:
+                yield TokenType.types[i]
+            mask >>= 1
+            i += 1
+    def __len__(self):
+        return bin(self.mask).count("1")
+    def __or__(self, o):
+        return TokenSet(self, o)
+    def __and__(self, o):
+        s = TokenSet()
+        s.mask = self.mask & TokenSet(o).mask
+        return s
+    def __sub__(self, o):
+        s = TokenSet()
+        s.mask = self.mask & ~TokenSet(o).mask
+        return s
+    def __eq__(self, o):
+        return isinstance(o, TokenSet) and self.mask == o.mask
+    def __hash__(self):
+        return hash(self.mask)
+    def __repr__(self):
+        return "TokenSet({})".format(", ".join(t.name for t in self))
+
+class Token:
+    encoding = None
+    index = None
+    start = end = None
+    
+    def __init__(self, type_: TokenType, value) -> None:
+        if not isinstance(type_, TokenType):
+            raise TypeError(
+                f"type_ argument must be TokenType not {type(type_).__name__}"
+            )
+        self.type, self.raw = type_, value
+    def __getattr__(self, name):
+        # line and col are only stored when set explicitly, else they come from the line index
+        if name == "line" or name == "col":
+            if self.index is None or self.start is None:
+                return None
+            return self.index.lc(self.start)[name == "col"]
+        raise AttributeError(name)
+    @property
+    def value(self):
+        # tokens from a bytes mode lexer are decoded the first time the value is used
+        if self.encoding is not None:
+            if isinstance(self.raw, (bytes, bytearray)):
+                self.raw = self.raw.decode(self.encoding)
+            self.encoding = None
+        return self.raw
+    @value.setter
+    def value(self, value):
+        self.raw = value
+    def set_lc(self, line:int, col:int):
+        self.line, self.col = line, col
+    def set_span(self, start:int, end:int):
+        self.start, self.end = start, end
+    def __repr__(self) -> str:
+        return "Token({type}, '{value}')".format(
+            type=self.type,value=self.value
+        )
+    def __eq__(self, o: object) -> bool:
+        if isinstance(o, Token):
+            return (self.type == o.type and self.value == o.value)
+        if o is self.type:
+            return True
+        return (self.type == o) if isinstance(o, TokenType) else (self.value == o)
+    def __ne__(self, o: object) -> bool:
+        return not self.__eq__(o)
+
+def generate_tokens(name: str, tokens: Iterable[str], build:bool=False):
+    if not name.isidentifier():
+        raise TypeError(
+                f"Invalid class name: {name}"
+            )
+    for t in tokens:
+        if not t.isidentifier():
+            raise TypeError(
+                f"Invalid token name: {t}"
+            )
+    if build is True:
+        return """\
+class {name}:
+{attributes}\
+""".format(
+            name=name,
+            attributes="\n".join(
+                (f"    {t} = TokenType('{t}')" for t in tokens)
+            )
+        )
+    return type(name, (), {t: TokenType(t) for t in tokens})
+
+class TokenTree:
+    
+    def __init__(self, source: str, *tokens: Token, index:LineIndex=None) -> None:
+        self.source = source
+        self.index = LineIndex(source) if index is None else index
+        self.tokens, self.len_t = tokens, len(tokens)
+        self.pos, self.token, self.last = -1, None, None
+    
+    def __getitem__(self, index):
+        return self.tokens[index]
+    
+    def cursor(self):
+        """
+        Another tree over the same tokens (they are not copied) with its own position and no memo,
+        so many parsers can run on the tokens at once.
+        """
+        tree = object.__new__(type(self))
+        tree.__dict__.update(self.__dict__)
+        tree.__dict__.pop("memo", None)
+        tree.pos, tree.token, tree.last = -1, None, None
+        return tree
+    
+    # the last token `lc` was asked for and its (line, col)
+    lc_token = lc_value = None
+    
+    def lc(self) -> tuple:
+        """(line, col) of the last token, found once for every token."""
+        last = self.last
+        if last is None:
+            return 0, 0
+        if last is self.lc_token:
+            return self.lc_value
+        d = last.__dict__
+        if "line" in d:
+            # set explicitly
+            lc = d["line"], d["col"] if "col" in d else last.col
+        elif last.index is None or last.start is None:
+            lc = None, None
+        else:
+            lc = last.index.lc(last.start)
+        self.lc_token, self.lc_value = last, lc
+        return lc
+    
+    @property
+    def line(self):
+        return self.lc()[0]
+    
+    @property
+    def col(self):
+        return self.lc()[1]
+    
+    @property
+    def offset(self):
+        return 0 if self.last is None else self.last.start
+    
+    def next_token(self):
+        self.pos += 1
+        if self.pos >= self.len_t:
+            self.token = None
+            return self.token
+        else:
+            self.token = self.last = self.tokens[self.pos]
+            return self.token
+    
+    def seek(self, pos:int):
+        """Go back (or forward) to the token at `pos`, like after `pos+1` calls of next_token."""
+        self.pos = pos
+        self.token = self.tokens[pos] if 0 <= pos < self.len_t else None
+        if self.token is not None:
+            self.last = self.token
+        else:
+            self.last = self.tokens[min(pos, self.len_t)-1] if pos > 0 and self.len_t else None
+    
+    def peek(self, step:int=1):
+        p = self.pos+step
+        if p >= self.len_t:
+            return None
+        return self.tokens[p]
+    
+    def get(self, o: object, default=None):
+        for t in self.tokens:
+            if t == o:
+                return t
+        return default
+    
+    def __repr__(self):
+        string = "TokenTree:\n"
+        space = " "*len(string[:-1])
+        for token in self.tokens:
+            head = f"{token.type}:"
+            content = f"{' '*len(head)}\"{token.value}\""
+            string += space+head+"\n"+space+content+"\n"
+        return string
+
+class CompactTokenTree(TokenTree):
+    """
+    TokenTree that keep its tokens in array columns (type id and span).
+    A Token object is only made when it's needed (`tree[i]`, `next_token`, `peek`
+    or iteration). Values that are the same as their text in the source are not
+    stored, they are sliced from the source again.
+    """
+    
+    def __init__(self, source: str, *tokens: Token, index:LineIndex=None) -> None:
+        self.source = source
+        self.index = LineIndex(source) if index is None else index
+        self.type_col = array("I")
+        self.starts, self.ends = array("q"), array("q")
+        self.values, self.lcs, self.encoding = {}, {}, None
+        self.pos, self.token, self.last = -1, None, None
+        self.extend(tokens)
+    
+    def append(self, token: Token):
+        if token.encoding is not None:
+            self.encoding = token.encoding
+        index = len(self.type_col)
+        self.type_col.append(token.type.id)
+        if "line" in token.__dict__ or "col" in token.__dict__:
+            self.lcs[index] = (token.line, token.col)
+        if token.start is None:
+            self.starts.append(-1)
+            self.ends.append(-1)
+            self.values[index] = token.raw
+            return
+        self.starts.append(token.start)
+        self.ends.append(token.end)
+        raw = token.raw
+        if type(raw) not in (str, bytes) or raw != self.source[token.start:token.end]:
+            self.values[index] = raw
+    
+    def extend(self, tokens: Iterable[Token]):
+        for token in tokens:
+            self.append(token)
+    
+    @property
+    def tokens(self):
+        return self
+    
+    @property
+    def len_t(self):
+        return len(self.type_col)
+    
+    def __len__(self):
+        return len(self.type_col)
+    
+    def __iter__(self):
+        for i in range(len(self.type_col)):
+            yield self[i]
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self[i] for i in range(*index.indices(len(self.type_col))))
+        if index < 0:
+            index += len(self.type_col)
+        if not 0 <= index < len(self.type_col):
+            raise IndexError("token index out of range")
+        start, end = self.starts[index], self.ends[index]
+        if index in self.values:
+            value = self.values[index]
+        else:
+            value = self.source[start:end]
+        token = Token(TokenType.types[self.type_col[index]], value)
+        if index in self.lcs:
+            token.set_lc(*self.lcs[index])
+        if start != -1:
+            token.set_span(start, end)
+            token.index = self.index
+        if self.encoding is not None:
+            token.encoding = self.encoding
+        return token
+class StreamTokenTree(TokenTree):
+    """
+    TokenTree that pull its tokens from an iterator (`LPV_Lexer.lex_lazy`) only when the parser
+    need them. Tokens are kept in a ring buffer: the lookahead and the last `size` tokens,
+    so `seek` (and `parser.reset`) can't go back further than that. `tree[i]` and `tokens`
+    only have the tokens still in the buffer.
+    """
+    
+    def __init__(self, source: str, tokens: Iterator[Token], index:LineIndex=None, size:int=64) -> None:
+        self.source = source
+        self.index = LineIndex(source) if index is None else index
+        self.feed, self.size = iter(tokens), size
+        capacity = 8
+        while capacity <= size:
+            capacity <<= 1
+        self.buffer, self.mask = [None]*capacity, capacity-1
+        # tokens from low to high (not included) are in the buffer, at buffer[pos & mask]
+        self.low = self.high = 0
+        self.pos, self.token, self.last = -1, None, None
+    
+    def cursor(self):
+        raise TypeError("A StreamTokenTree can only be read once, it can't have another cursor")
+    
+    def fill(self, upto:int) -> bool:
+        """Pull tokens until the one at `upto` is in the buffer, False if there is not that much tokens."""
+        while self.high <= upto:
+            if self.feed is None:
+                return False
+            token = next(self.feed, None)
+            if token is None:
+                self.feed = None
+                return False
+            if self.high-self.low > self.mask:
+                if self.low < self.pos-self.size:
+                    # the oldest token is far enough behind, its slot is reused
+                    self.low += 1
+                else:
+                    self.grow()
+            self.buffer[self.high & self.mask] = token
+            self.high += 1
+        return True
+    
+    def grow(self):
+        old, old_mask = self.buffer, self.mask
+        self.buffer, self.mask = [None]*(len(old)*2), len(old)*2-1
+        for p in range(self.low, self.high):
+            self.buffer[p & self.mask] = old[p & old_mask]
+    
+    @property
+    def tokens(self):
+        return tuple(self.buffer[p & self.mask] for p in range(self.low, self.high))
+    
+    def __getitem__(self, index):
+        if index >= self.high:
+            self.fill(index)
+        if not self.low <= index < self.high:
+            raise IndexError(f"token {index} is not in the buffer (tokens {self.low} to {self.high-1})")
+        return self.buffer[index & self.mask]
+    
+    def next_token(self):
+        pos = self.pos = self.pos+1
+        if pos >= self.high and not self.fill(pos):
+            self.token = None
+            return None
+        self.token = self.last = self.buffer[pos & self.mask]
+        return self.token
+    
+    def seek(self, pos:int):
+        if pos < self.low and (pos >= 0 or self.low > 0):
+            raise TypeError(
+                f"can't go back to token {pos}, only the last {self.size} tokens are kept "
+                "(give a bigger size to lex_lazy)"
+            )
+        self.pos = pos
+        if pos >= 0 and (pos < self.high or self.fill(pos)):
+            self.token = self.last = self.buffer[pos & self.mask]
+        else:
+            self.token = None
+            self.last = self.buffer[(self.high-1) & self.mask] if pos > 0 and self.high > 0 else None
+    
+    def peek(self, step:int=1):
+        p = self.pos+step
+        if p >= self.high and not self.fill(p):
+            return None
+        return self[p]
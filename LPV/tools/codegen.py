@@ -0,0 +1,259 @@
+# MIT License
+
+# Copyright (c) 2021 xp
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import hashlib, importlib.util, os, re, sys, tempfile, types
+from typing import Union
+from LPV.src.lexer import LPV_Lexer
+from LPV.src.rule import (
+    StringMatcher, BytesMatcher, TrieMatcher, PredicateMatcher, RegexMatcher, CharClassMatcher
+)
+
+def describe(pattern):
+    """What the generated code know about a rule pattern, anything Callable is taken from the lexer when it run."""
+    if isinstance(pattern, (str, bytes)):
+        return pattern
+    if isinstance(pattern, re.Pattern):
+        return ("re", pattern.pattern, pattern.flags)
+    if isinstance(pattern, (list, tuple)):
+        return (type(pattern).__name__, tuple(describe(p) for p in pattern))
+    if isinstance(pattern, set):
+        return ("set", tuple(sorted((describe(p) for p in pattern), key=repr)))
+    return "callable"
+
+def rule_signature(lexer: LPV_Lexer) -> tuple:
+    return (
+        tuple((describe(r.pattern), r.arity, r.consume) for r in lexer.compiled_rules),
+        lexer.bytes_mode, lexer.encoding
+    )
+
+class Writer:
+    
+    def __init__(self):
+        self.lines = []
+    
+    def __call__(self, indent:int, line: str):
+        self.lines.append("    "*indent+line)
+    
+    def code(self) -> str:
+        return "\n".join(self.lines)+"\n"
+
+def trie_strings(matcher: TrieMatcher) -> list:
+    strings = []
+    def walk(node, prefix):
+        for key, child in node.items():
+            if key is None:
+                strings.append(prefix)
+            else:
+                walk(child, prefix+(bytes((key,)) if isinstance(key, int) else key))
+    walk(matcher.root, b"" if any(isinstance(k, int) for k in matcher.root) else "")
+    return strings
+
+def write_test(i:int, matcher, bytes_mode:bool) -> tuple:
+    """
+    Lines of code that set `count` for rule `i` (or leave it None), and the condition
+    to check before them (the rule is skipped when it's False) or None.
+    """
+    def starts(s, at="pos"):
+        if bytes_mode is True:
+            return f"source[{at}:{at}+{len(s)}] == {s!r}"
+        return f"startswith({s!r}, {at})"
+    if type(matcher) in (StringMatcher, BytesMatcher) and matcher.incase_sensitive is False and matcher.string:
+        s = matcher.string
+        if len(s) == 1:
+            return f"char == {s!r}", [f"count = 1"]
+        return f"char == {s[:1]!r} and {starts(s)}", [f"count = {len(s)}"]
+    if type(matcher) is TrieMatcher and None not in matcher.root:
+        strings = trie_strings(matcher)
+        if matcher.incase_sensitive is False or all(s.isascii() for s in strings):
+            fold = (lambda s: s.lower()) if matcher.incase_sensitive is True else (lambda s: s)
+            groups = {}
+            # sorted so the code (and its hash) is the same every time
+            for s in sorted(strings, key=lambda s: (-len(s), s)):
+                groups.setdefault(fold(s[:1]), []).append(s)
+            if matcher.incase_sensitive is False:
+                key, body = "char", ["count = None"]
+            else:
+                key, body = "c", ["count, c = None, char.lower()"]
+            for n, (first, group) in enumerate(groups.items()):
+                body.append(f"{'if' if n == 0 else 'elif'} {key} == {first!r}:")
+                for m, s in enumerate(group):
+                    if len(s) == 1:
+                        # the first character already matched
+                        body.extend(("    count = 1",) if m == 0 else ("    else:", "        count = 1"))
+                        break
+                    if matcher.incase_sensitive is True:
+                        test = f"source[pos:pos+{len(s)}].lower() == {fold(s)!r}"
+                    else:
+                        test = starts(s)
+                    body.extend((f"    {'elif' if m else 'if'} {test}:", f"        count = {len(s)}"))
+            firsts = "{"+", ".join(repr(f) for f in sorted(groups))+"}"
+            if matcher.incase_sensitive is True:
+                return f"char.lower() in {firsts}", body
+            return f"char in {firsts}", body
+    if type(matcher) is PredicateMatcher:
+        return f"p{i}(char)", ["count = 1"]
+    if type(matcher) in (RegexMatcher, CharClassMatcher):
+        return None, [f"m = p{i}(source, pos)", "count = None if m is None or m.end() == pos else m.end()-pos"]
+    return None, [f"count = m{i}(source, pos)"]
+
+def generate_lexer(lexer: Union[LPV_Lexer, type]) -> str:
+    """
+    Python source of a module with a `scan` made for the rules of `lexer` (a lexer or a lexer class
+    made without arguments), with the matching of every rule written inline.
+    `module.lexer(LexerClass)` return the subclass using it.
+    """
+    if isinstance(lexer, type):
+        lexer = lexer()
+    if not isinstance(lexer, LPV_Lexer):
+        raise TypeError(f"lexer must be a LPV_Lexer not {type(lexer).__name__}")
+    cls, bytes_mode = type(lexer), lexer.bytes_mode
+    w = Writer()
+    w(0, f"# Generated by LPV.tools.codegen from {cls.__module__}.{cls.__qualname__}, don't edit.")
+    w(0, "from LPV.src.lexer import LPV_Lexer")
+    w(0, "from LPV.src.token import Token")
+    w(0, "from LPV.src.error import ErrorType")
+    w(0, "from LPV.tools.codegen import rule_signature")
+    w(0, "")
+    w(0, f"SIGNATURE = {rule_signature(lexer)!r}")
+    w(0, "")
+    w(0, "def scan(self, ignore_un_update_pos=False):")
+    w(1, "if self.feed is not None:")
+    w(2, "yield from LPV_Lexer.scan(self, ignore_un_update_pos)")
+    w(2, "return")
+    w(1, "source, index, rules = self.source, self.index, self.compiled_rules")
+    if bytes_mode is False:
+        w(1, "startswith = source.startswith")
+    tests = []
+    for i, rule in enumerate(lexer.compiled_rules):
+        matcher = rule.matcher
+        w(1, f"f{i} = rules[{i}].func")
+        condition, body = write_test(i, matcher, bytes_mode)
+        if any(line.startswith(f"m = p{i}") for line in body):
+            w(1, f"p{i} = rules[{i}].matcher.pattern.match")
+        elif f"p{i}(char)" == condition:
+            w(1, f"p{i} = rules[{i}].matcher.func")
+        elif body[0].startswith(f"count = m{i}"):
+            w(1, f"m{i} = rules[{i}].matcher.match")
+        tests.append((condition, body))
+    w(1, "while self.char is not None:")
+    w(2, "pos, char = self.pos, self.char")
+    for i, (rule, (condition, body)) in enumerate(zip(lexer.compiled_rules, tests)):
+        w(2, f"# rule {i}, {getattr(rule.func, '__name__', 'func')}")
+        indent = 2
+        if condition is not None:
+            w(2, f"if {condition}:")
+            indent = 3
+        for line in body:
+            w(indent, line)
+        if not (len(body) == 1 and body[0][8:].isdigit()):
+            w(indent, "if count is not None:")
+            indent += 1
+        w(indent, f"self.can_count, self.count_char = {rule.arity > 0}, count")
+        if rule.consume is True:
+            w(indent, "if self.mark is not None:")
+            w(indent+1, "self.flush_chars()")
+            w(indent, "text = source[pos:pos+count]")
+            w(indent, "self.forward(count)")
+            w(indent, f"r = f{i}({', '.join(('text', '(pos, pos+count)')[:rule.arity])})")
+        else:
+            w(indent, "if ignore_un_update_pos is False:")
+            w(indent+1, f"r = f{i}({'count' if rule.arity > 0 else ''})")
+            w(indent+1, "if self.pos == pos:")
+            w(indent+2, "raise TypeError(")
+            w(indent+3, f"f\"{{f{i}.__name__}} must move to the next position atleast once\"")
+            w(indent+3, "\"(avoiding infinity loop)\"")
+            w(indent+2, ")")
+            w(indent, "else:")
+            w(indent+1, f"r = f{i}()")
+        w(indent, "if r is not None:")
+        w(indent+1, "if not isinstance(r, Token):")
+        w(indent+2, "raise TypeError(\"function must return Token object\")")
+        w(indent+1, "if r.start is None:")
+        w(indent+2, "r.set_span(pos, self.pos)")
+        w(indent+1, "if r.index is None:")
+        w(indent+2, "r.index = index")
+        if bytes_mode is True:
+            w(indent+1, "r.encoding = self.encoding")
+        w(indent+1, "yield r")
+        w(indent, "continue")
+    if bytes_mode is True:
+        w(2, "char = char.decode(self.encoding, \"replace\")")
+    w(2, "self.throw_error(")
+    w(3, "ErrorType.SYNTAX,")
+    w(3, "f\"Invalid character: '{char}'\",")
+    w(3, "char=self.char")
+    w(2, ")")
+    w(0, "")
+    w(0, "def lexer(base: type) -> type:")
+    w(1, "def __init__(self, *args, **kwargs):")
+    w(2, "base.__init__(self, *args, **kwargs)")
+    w(2, "if rule_signature(self) != SIGNATURE:")
+    w(3, "raise TypeError(")
+    w(4, "f\"{base.__name__} rules are not the ones this lexer was generated from, generate it again\"")
+    w(3, ")")
+    w(1, "return type(\"Generated\"+base.__name__, (base,), {\"__init__\": __init__, \"scan\": scan})")
+    return w.code()
+
+def compile_lexer(lexer: Union[LPV_Lexer, type], cache_dir:str=None) -> type:
+    """
+    Generate the module of `lexer` (see generate_lexer), save it in `cache_dir` (a `lpv_lexers`
+    folder in the temp directory by default) named after the hash of its code, import it
+    and return the generated lexer class. The saved module is used again while the rules are the same.
+    The class can be pickled (given to lex_many, parse_many or lex_parallel) in this process and in the
+    workers it forks, workers started another way have to call compile_lexer first (give lex_many a
+    function doing it as `lexer`).
+    """
+    cls = lexer if isinstance(lexer, type) else type(lexer)
+    code = generate_lexer(lexer)
+    name = f"{cls.__name__}_{hashlib.sha1(code.encode()).hexdigest()[:16]}"
+    cache_dir = os.path.join(tempfile.gettempdir(), "lpv_lexers") if cache_dir is None else cache_dir
+    path = os.path.join(cache_dir, name+".py")
+    if not os.path.exists(path):
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(code)
+        os.replace(tmp, path)
+    # the modules are in a `lpv_lexers` package made here, so the generated classes can be pickled
+    # (for lex_many, parse_many and lex_parallel)
+    package = sys.modules.get("lpv_lexers")
+    if package is None:
+        package = types.ModuleType("lpv_lexers")
+        package.__path__ = []
+        package = sys.modules.setdefault("lpv_lexers", package)
+    if cache_dir not in package.__path__:
+        package.__path__.append(cache_dir)
+    module = sys.modules.get(f"lpv_lexers.{name}")
+    if module is None:
+        spec = importlib.util.spec_from_file_location(f"lpv_lexers.{name}", path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[spec.name] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[spec.name]
+            raise
+    generated = getattr(module, "Generated"+cls.__name__, None)
+    if generated is None:
+        # kept on the module, where pickle look for it
+        generated = module.lexer(cls)
+        setattr(module, generated.__name__, generated)
+    return generated
\ No newline at end of file
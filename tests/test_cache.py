@@ -0,0 +1,47 @@
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "example", "calculator"))
+from calc import Lexer, Parser, Interpreter
+from LPV import ParseCache
+
+def check_two_cycles(cache: ParseCache):
+    lexer, parser, source = Lexer(), Parser(), "1 + 2*3"
+    for _ in range(2):
+        tree = cache.lex(lexer, source)
+        node = parser.parse(tree)
+        assert Interpreter().run(node, source) == 7
+    assert cache.hits == 1 and cache.misses == 1
+
+def test_lex_parse_twice_shared():
+    check_two_cycles(ParseCache(share=True))
+
+def test_lex_parse_twice_pickled():
+    check_two_cycles(ParseCache())
+
+def test_shared_tree_parsed_by_many_threads():
+    from concurrent.futures import ThreadPoolExecutor
+    from calc import calc_lexer, calc_parser
+    cache, source = ParseCache(share=True), "+".join(["1"]*200)
+    def run(_):
+        node = calc_parser.parse(cache.lex(calc_lexer, source))
+        return Interpreter().run(node, source)
+    with ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(run, range(800)))
+    assert results == [200]*800
+
+def test_lexers_with_other_rules_get_other_entries():
+    from LPV import LPV_Lexer, LPV_Exception, Token, TokenType
+    import pytest
+    KEYWORD = TokenType("KEYWORD")
+    class KW(LPV_Lexer):
+        def __init__(self, words):
+            self.rules = ((words, self.lex_kw), (" ", self.lex_ws))
+            super().__init__()
+        def lex_kw(self, n):
+            return Token(KEYWORD, self.enter_clear(n))
+        def lex_ws(self):
+            self.skip()
+    cache = ParseCache()
+    assert len(cache.lex(KW(["a"]), "a a", crash_handler=lambda e: None).tokens) == 2
+    with pytest.raises(LPV_Exception):
+        cache.lex(KW(["b"]), "a a", crash_handler=lambda e: None)
+    assert cache.misses == 2